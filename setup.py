@@ -10,7 +10,7 @@ setup(
     name='sgtk-menu',
     version='1.4.2',
     description='GTK menu for sway, i3 and some other WMs',
-    packages=find_packages(),
+    packages=find_packages(exclude=['tests']),
     include_package_data=True,
     package_data={
         "": ["config/*"]
@@ -19,11 +19,11 @@ setup(
     license='GPL3',
     author='Piotr Miller',
     author_email='nwg.piotr@gmail.com',
-    python_requires='>=3.4.0',
+    python_requires='>=3.7.0',
     install_requires=['pygobject', 'pycairo', 'setuptools'],
     entry_points={
         'gui_scripts': [
-            'sgtk-menu = sgtk_menu.menu:main',
+            'sgtk-menu = sgtk_menu.launcher:main',
             'sgtk-bar = sgtk_menu.bar:main',
             'sgtk-dmenu = sgtk_menu.dmenu:main',
             'sgtk-grid = sgtk_menu.grid:main',
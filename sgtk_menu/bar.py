@@ -19,45 +19,34 @@ import sys
 import subprocess
 import argparse
 
+# Imported first, so that the startup timings include the GTK import
+from sgtk_menu import timings
 import gi
 
 gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk, Gdk, GdkPixbuf
+from gi.repository import Gtk, Gdk
 import cairo
 
 from sgtk_menu.tools import (
-    config_dirs, load_json, create_default_configs, check_wm, display_geometry)
+    config_dirs, load_json, create_default_configs, check_wm, install_window_rules, mouse_controller,
+    watch_window_rules, wait_for_geometry)
+from sgtk_menu.icons import load_image
+from sgtk_menu.spawn import spawn
 
-wm = check_wm()
-
-# This will apply to the overlay window; we can't do so outside the config file on i3.
-# We'll do it for i3 by applying commands to the focused window in open_menu method.
-if wm == "sway":
-    var = subprocess.run(['swaymsg', 'for_window', '[title=\"~sgtk*\"]', 'floating', 'enable'],
-                         stdout=subprocess.DEVNULL).returncode == 0
-    var = subprocess.run(['swaymsg', 'for_window', '[title=\"~sgtk*\"]', 'border', 'none'],
-                         stdout=subprocess.DEVNULL).returncode == 0
-
-other_wm = not wm == "sway" and not wm == "i3"
-
-mouse_pointer = None
-if not wm == "sway":
-    try:
-        from pynput.mouse import Controller
-        mouse_pointer = Controller()
-    except:
-        pass
+# Detected in main(), so that importing the module has no side effects
+wm = None
+other_wm = False
+mouse_pointer = None  # pynput mouse Controller, if available
 
 win = None  # overlay window
 args = None
 
 config_dir = config_dirs()[0]
-if not os.path.exists(config_dir):
-    os.makedirs(config_dir)
 build_from_file = os.path.join(config_dirs()[0], 'exit')
 
 
 def main():
+    timings.mark("imports")
     # exit if already running, thanks to Slava V at https://stackoverflow.com/a/384493/4040598
     pid_file = os.path.join(tempfile.gettempdir(), 'sgtk-bar.pid')
     fp = open(pid_file, 'w')
@@ -87,11 +76,27 @@ def main():
     parser.add_argument("-css", type=str, default="style.css",
                         help="use alternative {} style sheet instead of style.css"
                         .format(os.path.join(config_dir, '<CSS>')))
+    parser.add_argument("--timings", type=str, nargs="?", const="-", metavar="FILE",
+                        help="print startup phase timings as JSON to stderr, or append them to FILE "
+                             "(or set ${})".format(timings.ENV_VAR))
     global args
     args = parser.parse_args()
+    timings.enable('sgtk-bar', args.timings)
+    timings.mark("args")
+
+    global wm, other_wm, mouse_pointer
+    wm = check_wm()
+    timings.mark("wm")
+    # This will apply to the overlay window; we can't do so outside the config file on i3.
+    # We'll do it for i3 by applying commands to the focused window in open_menu method.
+    install_window_rules(wm)
+    other_wm = not wm == "sway" and not wm == "i3"
+    mouse_pointer = mouse_controller(wm)
+    timings.mark("wm_setup")
 
     # Create default config files if not found
     create_default_configs(config_dir)
+    timings.mark("configs")
 
     css_file = os.path.join(config_dirs()[0], args.css) if os.path.exists(
         os.path.join(config_dirs()[0], 'style.css')) else None
@@ -114,6 +119,7 @@ def main():
                 screen, provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
         except Exception as e:
             print(e)
+    timings.mark("css")
 
     screen = Gdk.Screen.get_default()
     provider = Gtk.CssProvider()
@@ -125,22 +131,21 @@ def main():
     # Overlay window
     global win
     win = MainWindow()
+    # in case `swaymsg reload` dropped the rules installed above
+    watch_window_rules(win, wm)
+    timings.mark("window")
 
-    geometry = (0, 0, 0, 0)
-    # If we're not on sway neither i3, this won't return values until the window actually shows up.
-    # Let's try as many times as needed. The retries int protects from an infinite loop.
-    retries = 0
-    while geometry[0] == 0 and geometry[1] == 0 and geometry[2] == 0 and geometry[3] == 0:
-        geometry = display_geometry(win, wm, mouse_pointer)
-        retries += 1
-        if retries > 50:
-            print("\nFailed to get the current screen geometry, exiting...\n")
-            sys.exit(2)
+    geometry = wait_for_geometry(win, wm, mouse_pointer)
+    if not geometry:
+        print("\nFailed to get the current screen geometry, exiting...\n")
+        sys.exit(2)
     x, y, w, h = geometry
+    timings.mark("geometry")
 
     if wm == "sway":
         win.resize(w, h)
 
+    win.connect("map-event", timings.first_shown("map"))
     win.show_all()
     # If done inside the constructor on Openbox, stops the window from grabbing focus!
     win.set_skip_taskbar_hint(True)
@@ -222,7 +227,6 @@ class MainWindow(Gtk.Window):
 
 
 def build_bar():
-    icon_theme = Gtk.IconTheme.get_default()
     orientation = Gtk.Orientation.VERTICAL if args.vertical else Gtk.Orientation.HORIZONTAL
     box = Gtk.Box(orientation=orientation)
     box.set_property("name", "bar")
@@ -232,25 +236,7 @@ def build_bar():
         name = entry["name"]
         exec = entry["exec"]
         icon = entry["icon"]
-        image = None
-        if icon.startswith('/'):
-            try:
-                pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(icon, args.s, args.s)
-                image = Gtk.Image.new_from_pixbuf(pixbuf)
-            except:
-                pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(os.path.join(config_dir, 'icon-missing.svg'), args.s,
-                                                                args.s)
-                image = Gtk.Image.new_from_pixbuf(pixbuf)
-        else:
-            try:
-                if icon.endswith('.svg') or icon.endswith('.png'):
-                    icon = entry.icon.split('.')[0]
-                pixbuf = icon_theme.load_icon(icon, args.s, Gtk.IconLookupFlags.FORCE_SIZE)
-                image = Gtk.Image.new_from_pixbuf(pixbuf)
-            except:
-                pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(os.path.join(config_dir, 'icon-missing.svg'), args.s,
-                                                                args.s)
-                image = Gtk.Image.new_from_pixbuf(pixbuf)
+        image = load_image(icon, args.s)
 
         button = Gtk.Button()
         button.set_property("name", "button")
@@ -268,7 +254,7 @@ def build_bar():
 
 def launch(item, command):
     # run the command an quit
-    subprocess.Popen('exec {}'.format(command), shell=True)
+    spawn(command)
     Gtk.main_quit()
 
 
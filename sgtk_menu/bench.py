@@ -0,0 +1,551 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Benchmarks of sgtk-menu hot paths. Results are printed as JSON; nothing but the optional widgets part of the suite
+needs a display.
+
+Usage: python3 -m sgtk_menu.bench <benchmark> [options]; see -h for the list of benchmarks.
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+import os
+import sys
+import resource
+import argparse
+import json
+import shutil
+import subprocess
+import tempfile
+import time
+
+from operator import itemgetter
+
+from sgtk_menu.categories import DesktopEntry, Categories
+from sgtk_menu.entries import parse_files, list_desktop_entries, index_file, DEFAULT_WORKERS
+from sgtk_menu.search import SearchIndex
+from sgtk_menu.spawn import spawn
+from sgtk_menu.commands import list_commands, index_file as commands_index_file
+from sgtk_menu.tools import localized_category_names, category_names_file, data_dirs
+
+# Max median import time of a launcher module, in milliseconds
+IMPORT_BUDGET = 150
+
+main_categories = ['AudioVideo', 'Development', 'Game', 'Graphics', 'Network', 'Office', 'Science', 'Settings',
+                   'System', 'Utility']
+
+# Categories of synthetic entries: main ones, additional ones (to be mapped to main), and combinations
+entry_categories = main_categories + ['Audio;Player', 'IDE', 'WebBrowser;Network', 'ArcadeGame;Game',
+                                      'RasterGraphics', 'Spreadsheet', 'Education;Math', 'DesktopSettings',
+                                      'TerminalEmulator', 'Archiving;Utility', 'Unknown', '']
+
+# Words to build synthetic names of, so that search phrases match some entries, but not all of them
+name_words = ['Audio', 'Browser', 'Calculator', 'Editor', 'Files', 'Image', 'Mail', 'Monitor', 'Player', 'Terminal',
+              'Viewer', 'Writer']
+
+
+def make_desktop_files(path, count, locales=('de',)):
+    """
+    Writes count synthetic .desktop files to path
+    :param locales: languages to add localized names in
+    :return: list of file paths
+    """
+    os.makedirs(path, exist_ok=True)
+    file_paths = []
+    for i in range(count):
+        file_path = os.path.join(path, 'app-{:05d}.desktop'.format(i))
+        categories = entry_categories[i % len(entry_categories)]
+        name = '{} {}'.format(name_words[i % len(name_words)], i)
+        lines = ['[Desktop Entry]', 'Type=Application', 'Name={}'.format(name)]
+        lines += ['Name[{}]={} ({})'.format(lang, name, lang) for lang in locales]
+        lines += ['Comment=Synthetic entry number {}'.format(i),
+                  'Exec=app-{} %U'.format(i),
+                  'Icon=app-{}'.format(i),
+                  'Categories={};'.format(categories) if categories else 'Categories=',
+                  '',
+                  '[Desktop Action new-window]',
+                  'Name=New Window',
+                  'Exec=app-{} --new-window'.format(i)]
+        with open(file_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        file_paths.append(file_path)
+    return file_paths
+
+
+def make_directory_files(path, count, locales=('de',)):
+    """
+    Writes count synthetic desktop-directories entries (translations of category names) to path
+    """
+    os.makedirs(path, exist_ok=True)
+    categories = main_categories + [c for c in entry_categories if c and ';' not in c and c not in main_categories]
+    for i in range(count):
+        name = categories[i % len(categories)]
+        lines = ['[Desktop Entry]', 'Type=Directory', 'Name={}'.format(name)]
+        lines += ['Name[{}]={} ({})'.format(lang, name, lang) for lang in locales]
+        lines += ['Icon=applications-other']
+        with open(os.path.join(path, 'sgtk-bench-{:04d}.directory'.format(i)), 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+
+def make_icons(path, count):
+    """
+    Writes count synthetic SVG icons, named like the icons of synthetic .desktop files, to a hicolor theme in path
+    """
+    theme_dir = os.path.join(path, 'hicolor')
+    apps_dir = os.path.join(theme_dir, 'scalable', 'apps')
+    os.makedirs(apps_dir, exist_ok=True)
+    with open(os.path.join(theme_dir, 'index.theme'), 'w') as f:
+        f.write('[Icon Theme]\nName=Hicolor\nDirectories=scalable/apps\n\n'
+                '[scalable/apps]\nSize=48\nMinSize=16\nMaxSize=256\nType=Scalable\n')
+    for i in range(count):
+        with open(os.path.join(apps_dir, 'app-{}.svg'.format(i)), 'w') as f:
+            f.write('<svg xmlns="http://www.w3.org/2000/svg" width="48" height="48">'
+                    '<rect width="48" height="48" fill="#{:06x}"/></svg>\n'.format(i * 2654435761 % 0xffffff))
+
+
+def make_commands(path, count):
+    """
+    Writes count executable files to path
+    """
+    os.makedirs(path, exist_ok=True)
+    for i in range(count):
+        file_path = os.path.join(path, 'command-{:05d}'.format(i))
+        with open(file_path, 'w') as f:
+            f.write('#!/bin/sh\n')
+        os.chmod(file_path, 0o755)
+
+
+def time_it(func, repeat):
+    """
+    :return: dictionary: best and median time of repeat calls, in milliseconds
+    """
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return {"best_ms": round(times[0], 3), "median_ms": round(times[len(times) // 2], 3)}
+
+
+def bench_scan(args):
+    """
+    Cold parsing of .desktop files: the serial loop vs. the thread pool with various numbers of workers
+    """
+    tmp_dir = None
+    if args.dirs:
+        file_paths = []
+        for path in args.dirs:
+            file_paths += [os.path.join(path, f) for f in sorted(os.listdir(path))]
+    else:
+        tmp_dir = tempfile.mkdtemp(prefix='sgtk-bench-')
+        file_paths = make_desktop_files(os.path.join(tmp_dir, 'applications'), args.n)
+
+    results = {"files": len(file_paths),
+               "serial": time_it(lambda: parse_files(file_paths, '[de]', 1), args.r),
+               "workers": {}}
+    for workers in args.j:
+        results["workers"][str(workers)] = time_it(lambda: parse_files(file_paths, '[de]', workers), args.r)
+
+    if tmp_dir:
+        shutil.rmtree(tmp_dir)
+    return results
+
+
+def wait_for_exec(pid, target, timeout=5):
+    """
+    Polls /proc until the process runs the target binary
+    :return: True if it did before the timeout
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if os.readlink('/proc/{}/exe'.format(pid)) == target:
+                return True
+        except OSError:
+            pass
+    return False
+
+
+def bench_launch(args):
+    """
+    Click-to-exec latency: time from launch() being called to the target binary running in the child process.
+    "legacy" rewrites the JSON cache file and starts the command with /bin/sh (as launch() used to),
+    "spawn" executes argv directly, and leaves bookkeeping for later.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix='sgtk-bench-')
+    cache_file = os.path.join(tmp_dir, 'sgtk-menu')
+    cache = {'command-{}'.format(i): i for i in range(args.n)}
+    command = 'sleep 30'
+    target = os.path.realpath(shutil.which('sleep'))
+
+    def legacy():
+        cache[command] = cache.get(command, 0) + 1
+        with open(cache_file, 'w') as f:
+            json.dump(cache, f, indent=2)
+        return subprocess.Popen('exec {}'.format(command), shell=True)
+
+    def measure(launch):
+        times = []
+        for i in range(args.r):
+            start = time.perf_counter()
+            process = launch()
+            if process and wait_for_exec(process.pid, target):
+                times.append((time.perf_counter() - start) * 1000)
+            if process:
+                process.kill()
+                process.wait()
+        times.sort()
+        if not times:
+            return None
+        return {"best_ms": round(times[0], 3), "median_ms": round(times[len(times) // 2], 3)}
+
+    results = {"cache_entries": args.n,
+               "legacy": measure(legacy),
+               "spawn": measure(lambda: spawn(command))}
+    shutil.rmtree(tmp_dir)
+    return results
+
+
+def import_times(module, env):
+    """
+    Imports the module in a fresh interpreter with -X importtime
+    :return: (cumulative import time of the module in ms, list of (self time in ms, name)), or (None, error message)
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=env)
+    lines = result.stderr.decode().splitlines()
+    if result.returncode != 0:
+        return None, lines[-1] if lines else 'exit code {}'.format(result.returncode)
+    total, modules = None, []
+    for line in lines:
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            # header line
+            continue
+        name = fields[2].strip()
+        modules.append((self_us / 1000, name))
+        if fields[2].rstrip() == ' {}'.format(module):
+            total = cumulative_us / 1000
+    return total, modules
+
+
+def bench_import(args):
+    """
+    Import time of the launcher modules, against a budget. Imports run with HOME pointed to an empty directory,
+    so that we also see if importing creates any files (it should not: all the work belongs to main()).
+    """
+    tmp_dir = tempfile.mkdtemp(prefix='sgtk-bench-')
+    env = dict(os.environ, HOME=tmp_dir, PYTHONPATH=os.pathsep.join(sys.path))
+    for name in ['XDG_CONFIG_HOME', 'XDG_CACHE_HOME']:
+        env.pop(name, None)
+
+    results = {"budget_ms": args.budget, "modules": {}, "failed": False}
+    for module in args.modules:
+        times, slowest, error = [], [], None
+        for i in range(args.r):
+            total, modules = import_times(module, env)
+            if total is None:
+                error = modules
+                break
+            times.append(total)
+            slowest = sorted(modules, reverse=True)[:args.top]
+        if error:
+            results["modules"][module] = {"error": error}
+            results["failed"] = True
+            continue
+        times.sort()
+        results["modules"][module] = {"best_ms": round(times[0], 3), "median_ms": round(times[len(times) // 2], 3),
+                                      "slowest": [[name, round(ms, 3)] for ms, name in slowest],
+                                      "ok": times[len(times) // 2] <= args.budget}
+        if times[len(times) // 2] > args.budget:
+            results["failed"] = True
+
+    results["side_effects"] = sorted(os.listdir(tmp_dir))
+    if results["side_effects"]:
+        results["failed"] = True
+    shutil.rmtree(tmp_dir)
+    return results
+
+
+def bench_categorisation(entries, repeat):
+    """
+    Creating sgtk-menu DesktopEntry objects, and sorting them into categories
+    """
+    def categorise():
+        categories = Categories()
+        for item in entries:
+            categories.add(DesktopEntry(item["name"], item["exec"], item["icon"], item["categories"] or "Other;"))
+        categories.sort()
+
+    return time_it(categorise, repeat)
+
+
+def bench_search(entries, phrases, repeat):
+    """
+    Typing phrases into the search box, one character at a time
+    """
+    counts = {item["exec"]: i % 7 for i, item in enumerate(entries)}
+
+    def build():
+        return SearchIndex(entries, name=itemgetter('name'), command=itemgetter('exec'), counts=counts)
+
+    def typing():
+        index = build()
+        for phrase in phrases:
+            for i in range(1, len(phrase) + 1):
+                index.search(phrase[:i], limit=30)
+
+    return {"keystrokes": sum(len(phrase) for phrase in phrases),
+            "build_index": time_it(build, repeat),
+            "typing": time_it(typing, repeat)}
+
+
+def bench_widgets(entries, repeat):
+    """
+    Creating sgtk-menu items (with icons) for all the entries; needs a display: run under xvfb-run,
+    or with GDK_BACKEND=broadway and broadwayd running
+    """
+    try:
+        import gi
+        gi.require_version('Gtk', '3.0')
+        from gi.repository import Gdk
+        from sgtk_menu import menu
+    except (ImportError, ValueError) as e:
+        return {"skipped": str(e)}
+    if not Gdk.Display.get_default():
+        return {"skipped": "no display"}
+    menu.args = argparse.Namespace(s=20)
+
+    def build():
+        items = [menu.DesktopMenuItem(item["name"], item["exec"], item["icon"]) for item in entries]
+        for item in items:
+            item.destroy()
+
+    # The first run renders icons and fills the icon cache
+    first = time_it(build, 1)
+    return {"first_ms": first["best_ms"], "next": time_it(build, repeat)}
+
+
+def build_menu_once(args):
+    """
+    Builds the sgtk-menu menu of args.n synthetic entries once, in this process: either the way it's done on start
+    (lazy: category rows only), or with every submenu populated up front (eager, as before they were lazy)
+    :return: dictionary: build time in ms, growth of max RSS in kB, and number of entry items created
+    """
+    try:
+        import gi
+        gi.require_version('Gtk', '3.0')
+        from gi.repository import Gtk, Gdk
+        from sgtk_menu import menu
+    except (ImportError, ValueError) as e:
+        return {"skipped": str(e)}
+    if not Gdk.Display.get_default():
+        return {"skipped": "no display"}
+    menu.args = argparse.Namespace(s=20, t=30, no_menu=False, favourites=False, fn=None, append=False, af=None)
+    # stands in for the overlay window: build_menu() only needs the search box and signal handlers of it
+    menu.win = argparse.Namespace(search_box=Gtk.Entry(), search_items=lambda *a: False, die=lambda *a: None)
+    for i in range(args.n):
+        categories = entry_categories[i % len(entry_categories)]
+        menu.categories.add(DesktopEntry('{} {}'.format(name_words[i % len(name_words)], i), 'app-{}'.format(i),
+                                         'app-{}'.format(i), '{};'.format(categories) if categories else "Other;"))
+    menu.categories.sort()
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    main_menu = menu.build_menu()
+    if args.mode == "eager":
+        for item in main_menu.get_children():
+            if item.get_submenu():
+                menu.populate_submenu(item.get_submenu())
+    elapsed = (time.perf_counter() - start) * 1000
+    return {"ms": round(elapsed, 3), "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss,
+            "items": len(menu.all_items_list)}
+
+
+def bench_menu(args):
+    """
+    Startup cost of the sgtk-menu menu: all the submenus populated at start (eager) vs. on first open (lazy).
+    Every build runs in a fresh interpreter, so that memory growth is not hidden by what an earlier build allocated.
+    Icons come from a synthetic hicolor theme; one untimed build fills the icon cache first. Needs a display.
+    """
+    if args.mode:
+        return build_menu_once(args)
+
+    tmp_dir = tempfile.mkdtemp(prefix='sgtk-bench-')
+    home = os.path.join(tmp_dir, 'home')
+    make_icons(os.path.join(home, '.local', 'share', 'icons'), args.n)
+    env = dict(os.environ, HOME=home, XDG_CACHE_HOME=os.path.join(tmp_dir, 'cache'))
+    for name in ['XDG_DATA_HOME', 'XDG_CONFIG_HOME']:
+        env.pop(name, None)
+
+    def build(mode):
+        result = subprocess.run([sys.executable, '-m', 'sgtk_menu.bench', 'menu', '-n', str(args.n), '--mode', mode],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env)
+        try:
+            return json.loads(result.stdout.decode())["menu"]
+        except (ValueError, KeyError):
+            return {"skipped": "exit code {}".format(result.returncode)}
+
+    results = {"entries": args.n}
+    try:
+        warm_up = build("eager")
+        if "skipped" in warm_up:
+            return warm_up
+        for mode in ["eager", "lazy"]:
+            runs = [build(mode) for i in range(args.r)]
+            runs = [run for run in runs if "skipped" not in run]
+            if not runs:
+                return {"skipped": "{} build failed".format(mode)}
+            times = sorted(run["ms"] for run in runs)
+            rss = sorted(run["max_rss_kb"] for run in runs)
+            results[mode] = {"best_ms": times[0], "median_ms": times[len(times) // 2],
+                             "median_max_rss_kb": rss[len(rss) // 2], "items": runs[0]["items"]}
+    finally:
+        shutil.rmtree(tmp_dir)
+    return results
+
+
+def bench_suite(args):
+    """
+    Hot paths of the launchers over a synthetic XDG tree: $HOME/.local/share with .desktop files, desktop-directories
+    entries and icons, and a $PATH directory of executables. The environment is only changed for the time
+    of the benchmark. Note that data_dirs() always includes /usr/share and /usr/local/share too.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix='sgtk-bench-')
+    home = os.path.join(tmp_dir, 'home')
+    share = os.path.join(home, '.local', 'share')
+    cache_dir = os.path.join(tmp_dir, 'cache')
+    bin_dir = os.path.join(tmp_dir, 'bin')
+    os.makedirs(cache_dir)
+    make_desktop_files(os.path.join(share, 'applications'), args.n, args.locales)
+    make_directory_files(os.path.join(share, 'desktop-directories'), args.directories, args.locales)
+    make_icons(os.path.join(share, 'icons'), args.icons)
+    make_commands(bin_dir, args.commands)
+
+    environ = dict(os.environ)
+    os.environ.update(HOME=home, XDG_CACHE_HOME=cache_dir, PATH=bin_dir)
+    for name in ['XDG_DATA_HOME', 'XDG_DATA_DIRS', 'XDG_CONFIG_HOME']:
+        os.environ.pop(name, None)
+    locale = '[{}]'.format(args.locales[0]) if args.locales else '[en]'
+    paths = [os.path.join(share, 'applications')]
+
+    def list_entries():
+        return list_desktop_entries(paths, locale, cache_dir, workers=args.j)
+
+    def list_entries_cold():
+        if os.path.isfile(index_file(cache_dir)):
+            os.remove(index_file(cache_dir))
+        return list_entries()
+
+    def category_names():
+        return localized_category_names(locale, cache_dir, main_categories + ['Other'])
+
+    def category_names_cold():
+        if os.path.isfile(category_names_file(cache_dir)):
+            os.remove(category_names_file(cache_dir))
+        return category_names()
+
+    def list_commands_cold():
+        if os.path.isfile(commands_index_file(cache_dir)):
+            os.remove(commands_index_file(cache_dir))
+        return list_commands(cache_dir)
+
+    results = {"tree": {"desktop_files": args.n, "directories": args.directories, "icons": args.icons,
+                        "commands": args.commands, "locale": locale},
+               "data_dirs": data_dirs()}
+    try:
+        results["list_entries"] = {"cold": time_it(list_entries_cold, args.r), "warm": time_it(list_entries, args.r)}
+        entries = list_entries()
+        results["localized_category_names"] = {"cold": time_it(category_names_cold, args.r),
+                                               "warm": time_it(category_names, args.r)}
+        results["categorisation"] = bench_categorisation(entries, args.r)
+        results["search"] = bench_search(entries, args.phrases, args.r)
+        results["list_commands"] = {"cold": time_it(list_commands_cold, args.r),
+                                    "warm": time_it(lambda: list_commands(cache_dir), args.r)}
+        if args.widgets:
+            results["widgets"] = bench_widgets(entries, args.r)
+    finally:
+        os.environ.clear()
+        os.environ.update(environ)
+        shutil.rmtree(tmp_dir)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of sgtk-menu hot paths")
+    subparsers = parser.add_subparsers(dest="benchmark")
+
+    scan = subparsers.add_parser("scan", help="parsing .desktop files: serial loop vs. thread pool")
+    scan.add_argument("-n", type=int, default=1500, help="number of synthetic .desktop files (default: 1500)")
+    scan.add_argument("-j", type=int, nargs="+", default=[2, 4, 8], help="numbers of workers to try (default: 2 4 8)")
+    scan.add_argument("-r", type=int, default=5, help="repetitions (default: 5)")
+    scan.add_argument("--dirs", type=str, nargs="+", help="use existing directories instead of synthetic files")
+    scan.set_defaults(func=bench_scan)
+
+    launch = subparsers.add_parser("launch", help="click-to-exec latency: legacy launch() vs. spawn")
+    launch.add_argument("-n", type=int, default=200, help="number of entries in the cache file (default: 200)")
+    launch.add_argument("-r", type=int, default=20, help="repetitions (default: 20)")
+    launch.set_defaults(func=bench_launch)
+
+    suite = subparsers.add_parser("suite", help="hot paths over a synthetic XDG tree")
+    suite.add_argument("-n", type=int, default=2000, help="number of .desktop files (default: 2000)")
+    suite.add_argument("--icons", type=int, default=2000, help="number of icons (default: 2000)")
+    suite.add_argument("--directories", type=int, default=40,
+                       help="number of desktop-directories entries (default: 40)")
+    suite.add_argument("--commands", type=int, default=3000, help="number of executables in $PATH (default: 3000)")
+    suite.add_argument("--locales", type=str, nargs="*", default=['de', 'pl', 'fr'],
+                       help="languages of localized names; the first one is used (default: de pl fr)")
+    suite.add_argument("--phrases", type=str, nargs="+", default=['term', 'brows', 'vwr', 'app-1'],
+                       help="search phrases to type (default: term brows vwr app-1)")
+    suite.add_argument("-j", type=int, default=DEFAULT_WORKERS,
+                       help="threads to parse .desktop files with (default: {})".format(DEFAULT_WORKERS))
+    suite.add_argument("-r", type=int, default=5, help="repetitions (default: 5)")
+    suite.add_argument("--widgets", action="store_true",
+                       help="also time building menu items; needs a display (xvfb-run, or GDK_BACKEND=broadway)")
+    suite.set_defaults(func=bench_suite)
+
+    menu = subparsers.add_parser("menu", help="building the sgtk-menu menu: submenus populated at start vs. on first "
+                                              "open; needs a display (xvfb-run, or GDK_BACKEND=broadway)")
+    menu.add_argument("-n", type=int, default=2000, help="number of entries (default: 2000)")
+    menu.add_argument("-r", type=int, default=5, help="repetitions (default: 5)")
+    # Set for the child processes which do the actual builds
+    menu.add_argument("--mode", choices=["eager", "lazy"], help=argparse.SUPPRESS)
+    menu.set_defaults(func=bench_menu)
+
+    imports = subparsers.add_parser("import", help="import time of the launcher modules (python -X importtime), "
+                                                   "exits with 1 if over budget or if importing had side effects")
+    imports.add_argument("modules", type=str, nargs="*",
+                         default=['sgtk_menu.launcher', 'sgtk_menu.menu', 'sgtk_menu.grid', 'sgtk_menu.dmenu',
+                                  'sgtk_menu.bar'],
+                         help="modules to import (default: all the launchers)")
+    imports.add_argument("-b", "--budget", type=float, default=IMPORT_BUDGET,
+                         help="max median import time in milliseconds (default: {})".format(IMPORT_BUDGET))
+    imports.add_argument("-r", type=int, default=5, help="repetitions (default: 5)")
+    imports.add_argument("--top", type=int, default=5, help="number of slowest imports to list (default: 5)")
+    imports.set_defaults(func=bench_import)
+
+    args = parser.parse_args()
+    if not args.benchmark:
+        parser.print_help()
+        sys.exit(1)
+
+    results = args.func(args)
+    print(json.dumps({args.benchmark: results}, indent=2))
+    if results.get("failed"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
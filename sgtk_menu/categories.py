@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Sorting .desktop entries into main categories (submenus of sgtk-menu).
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+from sgtk_menu.tools import MAIN_CATEGORIES
+
+# In the order of submenus
+CATEGORY_NAMES = ['AudioVideo', 'Development', 'Game', 'Graphics', 'Network', 'Office', 'Science', 'Settings',
+                  'System', 'Utility', 'Other']
+
+
+class DesktopEntry(object):
+    """
+    Should be self-explanatory
+    """
+
+    def __init__(self, name, exec, icon=None, categories=None):
+        self.name = name
+        self.exec = exec
+        self.icon = icon
+        self.categories = categories.split(';')[:-1] if categories else []
+
+
+class Categories(object):
+    """
+    Buckets of entries by main category. Add all the entries, then sort() once; an entry goes to each main category
+    its categories map to, or to 'Other' if none of them does.
+    """
+
+    def __init__(self, names=CATEGORY_NAMES):
+        self.names = names
+        self.buckets = {name: [] for name in names}
+
+    def add(self, entry):
+        main_categories = {MAIN_CATEGORIES.get(category) for category in entry.categories}
+        main_categories.discard(None)
+        main_categories.discard('Other')
+        if not main_categories:
+            main_categories = {'Other'}
+        for name in main_categories:
+            if name in self.buckets:
+                self.buckets[name].append(entry)
+
+    def sort(self):
+        for bucket in self.buckets.values():
+            bucket.sort(key=lambda x: x.name)
+
+    def clear(self):
+        for bucket in self.buckets.values():
+            del bucket[:]
+
+    def __getitem__(self, name):
+        """
+        :return: list of entries of the main category
+        """
+        return self.buckets[name]
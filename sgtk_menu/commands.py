@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Commands found in $PATH, for sgtk-dmenu.
+
+The sorted list lives in $XDG_CACHE_HOME, together with the content and mtime of every $PATH directory. Adding,
+removing or renaming a file changes the directory mtime, so on a start we only stat() directories, and list nothing
+but those which have changed. If none has, the cached sorted list is returned as is.
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+import os
+
+from sgtk_menu.tools import load_json, save_json, path_dirs
+
+# Increase whenever the structure of the index changes
+INDEX_VERSION = 1
+
+
+def index_file(cache_dir):
+    return os.path.join(cache_dir, 'sgtk-dmenu-commands')
+
+
+def list_executables(path):
+    """
+    :return: sorted list of names of executable files (or symlinks to them) in the directory
+    """
+    names = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if not entry.name.startswith(".") and entry.is_file() and os.access(entry.path, os.X_OK):
+                    names.append(entry.name)
+            except OSError:
+                # e.g. broken symlink
+                pass
+    names.sort()
+    return names
+
+
+def list_commands(cache_dir):
+    """
+    :param cache_dir: where to keep the index
+    :return: sorted list of commands found in $PATH directories; of the same names in more directories,
+    the first one in $PATH wins, as it does in the shell
+    """
+    paths = path_dirs()
+    index = load_json(index_file(cache_dir)) if os.path.isfile(index_file(cache_dir)) else {}
+    if index.get("version") != INDEX_VERSION:
+        index = {}
+    cached_dirs = index.get("dirs", {})
+
+    dirs = {}
+    changed = index.get("path") != paths
+    for path in paths:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+        cached = cached_dirs.get(path)
+        if cached and cached["mtime"] == mtime:
+            dirs[path] = cached
+        else:
+            try:
+                dirs[path] = {"mtime": mtime, "commands": list_executables(path)}
+            except OSError as e:
+                print(e)
+                continue
+            changed = True
+    if set(dirs) != set(cached_dirs):
+        changed = True
+
+    if not changed and "commands" in index:
+        return index["commands"]
+
+    seen = set()
+    commands = []
+    for path in paths:
+        if path in dirs:
+            for command in dirs[path]["commands"]:
+                if command not in seen:
+                    seen.add(command)
+                    commands.append(command)
+    commands.sort()
+
+    try:
+        save_json({"version": INDEX_VERSION, "path": paths, "dirs": dirs, "commands": commands},
+                  index_file(cache_dir), indent=None)
+    except Exception as e:
+        print(e)
+    return commands
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+UNIX socket used to talk to a resident (--daemon) instance.
+
+A client sends a one-line command, e.g. "show", and reads a one-line reply. The daemon watches the socket from the GLib
+main loop, and also accepts SIGUSR1 as the "show" command.
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+import os
+import socket
+import signal
+
+from sgtk_menu.tools import runtime_dir
+
+# Longest command we accept, in bytes
+MAX_LINE = 65536
+
+
+def socket_path(name):
+    return os.path.join(runtime_dir(), '{}-{}.sock'.format(name, os.getuid()))
+
+
+def send_command(name, command):
+    """
+    :param name: program name, e.g. 'sgtk-menu'
+    :param command: command for the daemon
+    :return: reply of the daemon ('' if none), or None if no daemon received the command
+    """
+    path = socket_path(name)
+    if not os.path.exists(path):
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(1)
+    try:
+        client.connect(path)
+        client.sendall('{}\n'.format(command).encode())
+        client.shutdown(socket.SHUT_WR)
+        return read_line(client)
+    except OSError:
+        # Stale socket left by a daemon which is no longer running
+        return None
+    finally:
+        client.close()
+
+
+def read_line(connection, limit=MAX_LINE):
+    """
+    :return: first line received, w/o the line break
+    """
+    data = b''
+    while b'\n' not in data and len(data) < limit:
+        chunk = connection.recv(limit - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data.split(b'\n')[0].decode(errors='ignore').strip()
+
+
+def listen(name, callback):
+    """
+    Starts receiving commands; callback(command) will be called from the GLib main loop.
+    :param name: program name, e.g. 'sgtk-menu'
+    :param callback: function to be given the command string; returns the reply string, or None
+    :return: listening socket; keep the reference as long as the daemon runs
+    """
+    from gi.repository import GLib
+
+    path = socket_path(name)
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    os.chmod(path, 0o600)
+    server.listen(4)
+
+    def on_connection(source, condition):
+        try:
+            connection, address = server.accept()
+        except OSError as e:
+            print(e)
+            return True
+        with connection:
+            try:
+                connection.settimeout(1)
+                command = read_line(connection)
+                reply = callback(command) if command else None
+                connection.sendall('{}\n'.format(reply or '').encode())
+            except OSError as e:
+                print(e)
+        return True
+
+    def on_signal():
+        callback("show")
+        return True
+
+    GLib.io_add_watch(server.fileno(), GLib.PRIORITY_DEFAULT, GLib.IOCondition.IN, on_connection)
+    GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGUSR1, on_signal)
+
+    return server
@@ -19,52 +19,55 @@ import sys
 import subprocess
 import argparse
 
+# Imported first, so that the startup timings include the GTK import
+from sgtk_menu import timings
 import gi
 
 gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk, Gdk, GdkPixbuf, GLib
+from gi.repository import Gtk, Gdk, GLib
 import cairo
 
-from sgtk_menu.tools import (config_dirs, load_json, create_default_configs, check_wm, display_geometry, path_dirs)
-
-wm = check_wm()
+from sgtk_menu.tools import (config_dirs, load_json, create_default_configs, check_wm, install_window_rules,
+                             watch_window_rules, mouse_controller, wait_for_geometry, cache_home)
+from sgtk_menu.commands import list_commands
+from sgtk_menu.history import history_file, frecency, record_runs
+from sgtk_menu.icons import load_image
+from sgtk_menu.search import SearchIndex
+from sgtk_menu.usage import load_counts
+from sgtk_menu.spawn import spawn
+
+# Detected in main(), so that importing the module has no side effects
+wm = None
+other_wm = False
+mouse_pointer = None  # pynput mouse Controller, if available
 pipe_menu = None
 
-# This will apply to the overlay window, as setting the window type POPUP does not impress sway :)
-if wm == "sway":
-    var = subprocess.run(['swaymsg', 'for_window', '[title=\"~sgtk*\"]', 'floating', 'enable'],
-                         stdout=subprocess.DEVNULL).returncode == 0
-    var = subprocess.run(['swaymsg', 'for_window', '[title=\"~sgtk*\"]', 'border', 'none'],
-                         stdout=subprocess.DEVNULL).returncode == 0
-
-other_wm = not wm == "sway" and not wm == "i3"
-
-mouse_pointer = None
-if not wm == "sway":
-    try:
-        from pynput.mouse import Controller
-        mouse_pointer = Controller()
-    except:
-        pass
-
 win = None  # overlay window
 args = None
-all_items_list = []  # list of all DesktopMenuItem objects assigned to a command
+item_pool = []  # CommandMenuItem objects, reused to display the commands list and search results
 menu_items_list = []  # created / updated with menu.get_children()
 filtered_items_list = []  # used in the search method
 
 # What we found in $PATH
 all_commands_list = []
+initial_commands = []  # commands displayed before the user types anything: frecent ones first
+search_index = None  # SearchIndex of all_commands_list, built on the first search
 
 config_dir = config_dirs()[0]
-if not os.path.exists(config_dir):
-    os.makedirs(config_dir)
 
 # default custom menu template
 build_from_file = os.path.join(config_dirs()[0], 'appendix')
 
+# sgtk-menu and sgtk-grid track clicks in this file; we use them to rank search results
+cache_file = os.path.join(cache_home(), 'sgtk-menu')
+# ...and we track commands run from sgtk-dmenu in this one
+history_path = history_file(cache_home())
+scores = {}  # command => frecency score
+pending_launches = []  # commands launched, but not yet recorded in the history
+
 
 def main():
+    timings.mark("imports")
     # exit if already running, thanks to Slava V at https://stackoverflow.com/a/384493/4040598
     pid_file = os.path.join(tempfile.gettempdir(), 'sgtk-dmenu.pid')
     fp = open(pid_file, 'w')
@@ -98,13 +101,27 @@ def main():
     parser.add_argument("-d", type=int, default=100, help="menu delay in milliseconds (default: 100; sway & i3 only)")
     parser.add_argument("-o", type=float, default=0.3, help="overlay opacity (min: 0.0, max: 1.0, default: 0.3; "
                                                             "sway & i3 only)")
-    parser.add_argument("-t", type=int, default=15, help="lines limit (default: 20)")
+    parser.add_argument("-t", type=int, default=15, help="lines limit, also for search results (default: 15)")
     parser.add_argument("-y", type=int, default=0, help="y offset from edge to display menu at")
     parser.add_argument("-css", type=str, default="style.css",
                         help="use alternative {} style sheet instead of style.css"
                         .format(os.path.join(config_dir, '<CSS>')))
+    parser.add_argument("--timings", type=str, nargs="?", const="-", metavar="FILE",
+                        help="print startup phase timings as JSON to stderr, or append them to FILE "
+                             "(or set ${})".format(timings.ENV_VAR))
     global args
     args = parser.parse_args()
+    timings.enable('sgtk-dmenu', args.timings)
+    timings.mark("args")
+
+    global wm, other_wm, mouse_pointer
+    wm = check_wm()
+    timings.mark("wm")
+    # This will apply to the overlay window, as setting the window type POPUP does not impress sway :)
+    install_window_rules(wm)
+    other_wm = not wm == "sway" and not wm == "i3"
+    mouse_pointer = mouse_controller(wm)
+    timings.mark("wm_setup")
 
     if args.pointer and wm == "sway":
         args.pointer = False
@@ -114,8 +131,12 @@ def main():
         args.d = 0
         print("[-d] argument ignored if not-sway")
 
+    if not os.path.exists(cache_home()):
+        os.makedirs(cache_home())
+
     # Copy default templates and style sheet - if not found
     create_default_configs(config_dir)
+    timings.mark("configs")
 
     css_file = os.path.join(config_dirs()[0], args.css) if os.path.exists(
         os.path.join(config_dirs()[0], 'style.css')) else None
@@ -138,6 +159,7 @@ def main():
                 screen, provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
         except Exception as e:
             print(e)
+    timings.mark("css")
 
     screen = Gdk.Screen.get_default()
     provider = Gtk.CssProvider()
@@ -146,28 +168,28 @@ def main():
         screen, provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
     )
 
-    global all_commands_list
+    global all_commands_list, initial_commands
     if not pipe_menu:
-        all_commands_list = list_commands()
-        all_commands_list.sort()
+        all_commands_list = list_commands(cache_home())
+        initial_commands = frecent_first(all_commands_list, args.t)
     else:
         all_commands_list = pipe_menu
+        initial_commands = pipe_menu[:args.t]
+    timings.mark("list_commands")
 
     # Overlay window
     global win
     win = MainWindow()
+    # in case `swaymsg reload` dropped the rules installed above
+    watch_window_rules(win, wm)
+    timings.mark("window")
 
-    geometry = (0, 0, 0, 0)
-    # If we're not on sway neither i3, this won't return values until the window actually shows up.
-    # Let's try as many times as needed. The retries int protects from an infinite loop.
-    retries = 0
-    while geometry[0] == 0 and geometry[1] == 0 and geometry[2] == 0 and geometry[3] == 0:
-        geometry = display_geometry(win, wm, mouse_pointer)
-        retries += 1
-        if retries > 50:
-            print("\nFailed to get the current screen geometry, exiting...\n")
-            sys.exit(2)
+    geometry = wait_for_geometry(win, wm, mouse_pointer)
+    if not geometry:
+        print("\nFailed to get the current screen geometry, exiting...\n")
+        sys.exit(2)
     x, y, w, h = geometry
+    timings.mark("geometry")
 
     if wm == "sway":
         # resize to current screen dimensions on sway
@@ -189,8 +211,10 @@ def main():
 
         win.move(x, y)
 
-    win.menu = build_menu(all_commands_list)
+    win.menu = build_menu(initial_commands)
     win.menu.set_property("name", "menu")
+    timings.mark("build_menu")
+    win.menu.connect("popped-up", timings.first_shown("popped-up"))
 
     global menu_items_list
     menu_items_list = win.menu.get_children()
@@ -208,6 +232,8 @@ def main():
     GLib.timeout_add(args.d, open_menu)
     Gtk.main()
 
+    record_pending_launches()
+
 
 class MainWindow(Gtk.Window):
     def __init__(self):
@@ -287,12 +313,17 @@ class MainWindow(Gtk.Window):
                             self.menu.remove(item)
 
                     if " " not in self.search_phrase:
-                        filtered_items_list = [item for item in all_items_list if
-                                               self.search_phrase.upper() in item.get_label().upper()]
+                        global search_index
+                        if not search_index:
+                            # commands also run from sgtk-menu or sgtk-grid go first
+                            search_index = SearchIndex(all_commands_list, name=str, command=str,
+                                                       counts=search_counts())
+                        commands = search_index.search(self.search_phrase, limit=args.t)
                     else:
                         # if the string ends with space, search exact 1st word
                         first = self.search_phrase.split()[0].upper()
-                        filtered_items_list = [item for item in all_items_list if first == item.get_label().upper()]
+                        commands = [command for command in all_commands_list if first == command.upper()][:args.t]
+                    filtered_items_list = command_items(commands)
 
                     for item in filtered_items_list:
                         self.menu.append(item)
@@ -312,7 +343,8 @@ class MainWindow(Gtk.Window):
                     # clear search results
                     for item in self.menu.get_children():
                         self.menu.remove(item)
-                    # restore original menu
+                    # restore original menu; its command items come from the pool, too
+                    command_items(initial_commands)
                     for item in menu_items_list:
                         self.menu.append(item)
 
@@ -343,6 +375,7 @@ class MainWindow(Gtk.Window):
 
 
 def open_menu():
+    timings.mark("open_menu")
     if args.bottom:
         gravity_widget = Gdk.Gravity.NORTH
         gravity_menu = Gdk.Gravity.SOUTH
@@ -361,18 +394,7 @@ def open_menu():
         Gtk.main_quit()
 
 
-def list_commands():
-    commands = []
-    for path in path_dirs():
-        if os.path.exists(path):
-            for command in os.listdir(path):
-                if not command.startswith("."):
-                    commands.append(command)
-    return commands
-
-
 def build_menu(commands):
-    icon_theme = Gtk.IconTheme.get_default()
     menu = Gtk.Menu()
     win.search_item = Gtk.MenuItem()
     win.search_item.add(win.search_box)
@@ -380,14 +402,9 @@ def build_menu(commands):
     menu.add(win.search_item)
 
     # actual drun menu
-    for command in commands:
-        item = Gtk.MenuItem.new_with_label(command)
-        item.set_property("name", "item-dmenu")
-        item.connect('activate', launch, command)
-        all_items_list.append(item)
-
-    # At the beginning we'll only show args.t items. Nobody's gonna scroll through thousands of them.
-    for item in all_items_list[:args.t]:
+    # At the beginning we'll only show args.t items, frecent first (see frecent_first).
+    # Nobody's gonna scroll through thousands of them.
+    for item in command_items(commands):
         menu.append(item)
 
     # optional user-defined menu from default or custom template (see args)
@@ -404,21 +421,7 @@ def build_menu(commands):
             hbox = Gtk.HBox()
             label = Gtk.Label()
             label.set_text(name)
-            image = None
-            if icon.startswith('/'):
-                try:
-                    pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(icon, args.s, args.s)
-                    image = Gtk.Image.new_from_pixbuf(pixbuf)
-                except:
-                    pass
-            else:
-                try:
-                    if icon.endswith('.svg') or icon.endswith('.png'):
-                        icon = entry.icon.split('.')[0]
-                    pixbuf = icon_theme.load_icon(icon, args.s, Gtk.IconLookupFlags.FORCE_SIZE)
-                    image = Gtk.Image.new_from_pixbuf(pixbuf)
-                except:
-                    pass
+            image = load_image(icon, args.s, fallback=False)
             if image:
                 hbox.pack_start(image, False, False, 10)
             if name:
@@ -426,7 +429,7 @@ def build_menu(commands):
             item = Gtk.MenuItem()
             item.set_property("name", "item")
             item.add(hbox)
-            item.connect('activate', launch, exec)  # do not cache!
+            item.connect('activate', launch, exec, True)  # do not cache!
             menu.append(item)
 
     menu.connect("hide", win.die)
@@ -436,11 +439,82 @@ def build_menu(commands):
     return menu
 
 
-def launch(item, command):
-    # run the command an quit
-    subprocess.Popen('exec {}'.format(command), shell=True)
+class CommandMenuItem(Gtk.MenuItem):
+    """
+    Menu item we can (re)assign to any command, see command_items
+    """
+
+    def __init__(self):
+        Gtk.MenuItem.__init__(self)
+        self.set_property("name", "item-dmenu")
+        self.command = None
+
+    def bind(self, command):
+        self.command = command
+        self.set_label(command)
+
+
+def command_items(commands):
+    """
+    Binds commands to menu items from the item_pool. We never display more than args.t commands, so no matter
+    how many of them there are in $PATH, the pool won't grow any bigger.
+    :return: list of CommandMenuItem
+    """
+    while len(item_pool) < len(commands):
+        item = CommandMenuItem()
+        item.connect('activate', launch_item)
+        item.show_all()
+        item_pool.append(item)
+    for item, command in zip(item_pool, commands):
+        item.bind(command)
+    return item_pool[:len(commands)]
+
+
+def launch_item(item):
+    launch(item, item.command)
+
+
+def launch(item, command, no_cache=False):
+    # run the command an quit; we'll record it in the history once the window is gone
+    spawn(command)
+    if not no_cache:
+        pending_launches.append(command)
     Gtk.main_quit()
 
 
+def record_pending_launches():
+    if pending_launches and not pipe_menu:
+        record_runs(history_path, pending_launches)
+
+
+def frecent_first(commands, limit):
+    """
+    :return: up to limit commands: the ones from the history, which are still available, by score; then the rest
+    """
+    global scores
+    scores = frecency(history_path)
+    available = set(commands)
+    result = [command for command in sorted(scores, key=scores.get, reverse=True) if command in available][:limit]
+    if len(result) < limit:
+        seen = set(result)
+        for command in commands:
+            if command not in seen:
+                result.append(command)
+                if len(result) == limit:
+                    break
+    return result
+
+
+def search_counts():
+    """
+    :return: dictionary: command => weight of the command in search results (see search.SearchIndex):
+    clicks counted by sgtk-menu and sgtk-grid, plus the frecency score of dmenu history
+    """
+    counts = load_counts(cache_file)
+    for command, score in scores.items():
+        counts[command] = counts.get(command, 0) + score
+    return counts
+
+
 if __name__ == "__main__":
     main()
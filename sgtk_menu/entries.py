@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Parsing .desktop files, and the persistent index of their content, shared by sgtk-menu and sgtk-grid.
+
+Files are identified by desktop file IDs (see https://specifications.freedesktop.org/menu-spec/latest/go01.html):
+the path relative to the applications directory, with '/' replaced by '-', e.g. kde4/foo.desktop is kde4-foo.desktop.
+Of files with the same ID, the one in the first data directory wins, so that a user's copy in ~/.local/share
+shadows the system one. Precedence is resolved from directory listings alone, and we only open the winners.
+Entries with NoDisplay or Hidden set, or with a TryExec program which is not installed, are dropped.
+
+The index lives in $XDG_CACHE_HOME and holds the listing and mtime of every directory scanned, together with parsed
+fields and mtimes of the winning files. On a warm start we only stat() directories and files, and list or parse
+nothing but what has changed since the index was written.
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+import os
+import shlex
+import shutil
+import itertools
+
+from sgtk_menu.tools import load_json, save_json
+
+# Increase whenever the structure of the index or of parsed entries changes
+INDEX_VERSION = 4
+
+# Default number of threads to parse .desktop files with: on a local disk the serial loop is faster. Threads only pay
+# off where reading is slow, e.g. with a network-mounted home: see `python3 -m sgtk_menu.bench scan`, then use -j.
+DEFAULT_WORKERS = 1
+# A handful of modified files is not worth starting threads
+PARALLEL_MIN_FILES = 32
+
+# Field codes of files and URLs, and deprecated ones: we never pass any of them
+FILE_CODES = 'fFuUdDnNvm'
+
+
+def index_file(cache_dir):
+    return os.path.join(cache_dir, 'sgtk-menu-index')
+
+
+def parse_desktop_file(path, locale):
+    """
+    Reads the [Desktop Entry] group of a .desktop file
+    :param path: path to the file
+    :param locale: locale string, e.g. '[de]'
+    :return: dictionary: name, exec, icon, categories, comment, no_display, hidden, try_exec;
+    None if the file could not be read
+    """
+    name, loc_name, _exec, icon, categories, comment, loc_comment, try_exec = '', '', '', '', '', '', '', ''
+    no_display, hidden = False, False
+    loc_name_key = 'Name{}'.format(locale)
+    loc_comment_key = 'Comment{}'.format(locale)
+    try:
+        with open(path) as d:
+            lines = d.readlines()
+    except Exception as e:
+        print(e)
+        return None
+
+    read_me = True
+    for line in lines:
+        if line.startswith("["):
+            read_me = line.strip() == "[Desktop Entry]"
+            continue
+        if not read_me:
+            continue
+        key, sep, value = line.partition('=')
+        if not sep:
+            continue
+        key = key.strip()
+        value = value.strip()
+        if key == 'Name':
+            name = value
+        elif key == loc_name_key:
+            loc_name = value
+        elif key == 'Comment':
+            comment = value
+        elif key == loc_comment_key:
+            loc_comment = value
+        elif key == 'Exec':
+            _exec = value
+        elif key == 'Icon':
+            icon = value
+        elif key == 'Categories':
+            categories = value
+        elif key == 'NoDisplay':
+            no_display = value == 'true'
+        elif key == 'Hidden':
+            hidden = value == 'true'
+        elif key == 'TryExec':
+            try_exec = value
+
+    return {"name": loc_name or name,
+            "exec": expand_field_codes(_exec, loc_name or name, icon, path),
+            "icon": icon,
+            "categories": categories,
+            "comment": loc_comment or comment,
+            "no_display": no_display,
+            "hidden": hidden,
+            "try_exec": try_exec}
+
+
+def expand_field_codes(command, name, icon, path):
+    """
+    Expands field codes of the Exec key, see https://specifications.freedesktop.org/desktop-entry-spec/latest/ar01s07.html
+    The command is split into arguments first, and codes are expanded within them, so that expanded values never
+    need quoting twice. We never pass files nor URLs: an argument which is just %f, %F, %u, %U (or a deprecated code)
+    is dropped, and these codes expand to nothing inside other arguments.
+    :param command: Exec value
+    :param name: translated Name, for %c
+    :param icon: Icon value, for %i
+    :param path: path to the .desktop file, for %k
+    :return: command line, with arguments quoted for the shell
+    """
+    try:
+        tokens = shlex.split(command)
+    except ValueError as e:
+        print("{}: {}".format(path, e))
+        tokens = command.split()
+
+    argv = []
+    for token in tokens:
+        if token == '%i':
+            if icon:
+                argv += ['--icon', icon]
+            continue
+        if len(token) == 2 and token[0] == '%' and token[1] in FILE_CODES:
+            continue
+        argv.append(expand_token(token, name, icon, path))
+    return ' '.join(shlex.quote(arg) for arg in argv)
+
+
+def expand_token(token, name, icon, path):
+    """
+    :return: the argument with field codes expanded
+    """
+    result = ''
+    i = 0
+    while i < len(token):
+        char = token[i]
+        if char == '%' and i + 1 < len(token):
+            code = token[i + 1]
+            i += 2
+            if code == '%':
+                result += '%'
+            elif code == 'i':
+                result += icon
+            elif code == 'c':
+                result += name
+            elif code == 'k':
+                result += path
+        else:
+            result += char
+            i += 1
+    return result
+
+
+def load_index(cache_dir, locale):
+    """
+    :return: dictionary: directory path => {"mtime": ..., "names": [.desktop file names], "subdirs": [names],
+    "files": {file name: [mtime, entry]}}
+    """
+    index = load_json(index_file(cache_dir)) if os.path.isfile(index_file(cache_dir)) else {}
+    if index.get("version") != INDEX_VERSION or index.get("locale") != locale:
+        return {}
+    return index.get("dirs", {})
+
+
+def save_index(cache_dir, locale, dirs):
+    try:
+        save_json({"version": INDEX_VERSION, "locale": locale, "dirs": dirs}, index_file(cache_dir), indent=None)
+    except Exception as e:
+        print(e)
+
+
+def desktop_entries_state(paths):
+    """
+    Cheap check for a resident instance: any .desktop file added, removed or replaced changes it
+    :param paths: list of applications directories
+    :return: list of [directory, mtime] of the directories and their subdirectories
+    """
+    state = []
+    for path in paths:
+        for dir_path, dir_names, file_names in os.walk(path):
+            try:
+                state.append([dir_path, os.stat(dir_path).st_mtime_ns])
+            except OSError:
+                pass
+    return state
+
+
+def list_dir(path, cached):
+    """
+    :param path: directory to list
+    :param cached: the directory record from the index, or None
+    :return: ({"mtime", "names", "subdirs", "files"} with no files yet, True if the directory had to be listed);
+    None if the directory does not exist
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    if cached and cached["mtime"] == mtime:
+        # Nothing added nor removed: no need to list the directory
+        return {"mtime": mtime, "names": cached["names"], "subdirs": cached["subdirs"], "files": {}}, False
+
+    names, subdirs = [], []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name.startswith("."):
+                    continue
+                if entry.name.endswith(".desktop"):
+                    names.append(entry.name)
+                else:
+                    try:
+                        if entry.is_dir():
+                            subdirs.append(entry.name)
+                    except OSError:
+                        pass
+    except OSError as e:
+        print(e)
+        return None
+    names.sort()
+    subdirs.sort()
+    return {"mtime": mtime, "names": names, "subdirs": subdirs, "files": {}}, True
+
+
+def resolve_desktop_ids(paths, index, new_index):
+    """
+    Lists the directories (and their subdirectories), and picks a file for every desktop file ID
+    :param paths: list of applications directories, in the order of precedence
+    :param index: directory records from the previous run
+    :param new_index: dictionary to put records of the directories found into
+    :return: (dictionary: desktop file ID => [directory, file name] of the winner, True if anything was listed)
+    """
+    winners = {}
+    listed = False
+    for path in paths:
+        # [directory, ID prefix]
+        to_list = [[path, '']]
+        # Real paths of directories listed in this tree: a symlink may point to its own parent
+        visited = set()
+        while to_list:
+            directory, prefix = to_list.pop()
+            real_path = os.path.realpath(directory)
+            if real_path in visited or directory in new_index:
+                # a symlink loop, or the same directory in $XDG_DATA_DIRS twice
+                continue
+            visited.add(real_path)
+            result = list_dir(directory, index.get(directory))
+            if not result:
+                continue
+            record, was_listed = result
+            listed = listed or was_listed
+            new_index[directory] = record
+            for name in record["names"]:
+                desktop_id = prefix + name
+                if desktop_id not in winners:
+                    winners[desktop_id] = [directory, name]
+            for name in reversed(record["subdirs"]):
+                to_list.append([os.path.join(directory, name), '{}{}-'.format(prefix, name)])
+    return winners, listed
+
+
+def is_shown(entry, try_exec_found):
+    """
+    :param entry: parse_desktop_file result
+    :param try_exec_found: dictionary: TryExec value => True if the program is installed; filled as we go
+    :return: False if the entry should not make it to the menu
+    """
+    if entry["no_display"] or entry["hidden"]:
+        return False
+    try_exec = entry["try_exec"]
+    if try_exec:
+        if try_exec not in try_exec_found:
+            # finds absolute paths, too, as long as the file is executable
+            try_exec_found[try_exec] = shutil.which(try_exec) is not None
+        return try_exec_found[try_exec]
+    return True
+
+
+def parse_files(file_paths, locale, workers=1):
+    """
+    Parses given files with a pool of threads. Reading is mostly waiting for I/O (think of network-mounted homes),
+    so threads help despite the GIL.
+    :param file_paths: list of .desktop file paths
+    :param locale: locale string, e.g. '[de]'
+    :param workers: max number of threads; 1 means the plain serial loop
+    :return: list of parse_desktop_file results, in the order of file_paths
+    """
+    if workers > 1 and len(file_paths) >= PARALLEL_MIN_FILES:
+        # Not imported on top: it's slow (it imports logging), and sgtk-menu only needs DEFAULT_WORKERS
+        # to hand over to a resident instance
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(parse_desktop_file, file_paths, itertools.repeat(locale)))
+    return [parse_desktop_file(path, locale) for path in file_paths]
+
+
+def list_desktop_entries(paths, locale, cache_dir, workers=DEFAULT_WORKERS):
+    """
+    Returns parsed content of the winning file of every desktop file ID found in given directories, in the order
+    of paths. Files unchanged since the last run are taken from the index, instead of being parsed again.
+    :param paths: list of applications directories, in the order of precedence
+    :param locale: locale string, e.g. '[de]'
+    :param cache_dir: where to keep the index
+    :param workers: max number of threads to parse new and modified files with
+    :return: list of dictionaries (see parse_desktop_file) of entries to show
+    """
+    index = load_index(cache_dir, locale)
+    new_index = {}
+    winners, changed = resolve_desktop_ids(paths, index, new_index)
+
+    # [files dictionary, file name, file path] of records to (re)parse
+    to_parse = []
+    for directory, file_name in winners.values():
+        file_path = os.path.join(directory, file_name)
+        try:
+            mtime = os.stat(file_path).st_mtime_ns
+        except OSError:
+            # e.g. a broken symlink
+            continue
+        cached = index.get(directory)
+        record = cached["files"].get(file_name) if cached else None
+        files = new_index[directory]["files"]
+        if record and record[0] == mtime:
+            files[file_name] = record
+        else:
+            files[file_name] = [mtime, None]
+            to_parse.append((files, file_name, file_path))
+
+    if to_parse:
+        changed = True
+        results = parse_files([item[2] for item in to_parse], locale, workers)
+        for (files, file_name, file_path), entry in zip(to_parse, results):
+            files[file_name][1] = entry
+
+    if changed or set(index) != set(new_index) or any(
+            set(index[d]["files"]) != set(new_index[d]["files"]) for d in new_index if d in index):
+        save_index(cache_dir, locale, new_index)
+
+    # In the order of directories and their listing, whatever order the threads finished in
+    entries = []
+    try_exec_found = {}
+    for directory, file_name in winners.values():
+        record = new_index[directory]["files"].get(file_name)
+        if record and record[1] and is_shown(record[1], try_exec_found):
+            entries.append(record[1])
+    return entries
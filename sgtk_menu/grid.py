@@ -14,40 +14,37 @@ License: GPL3
 """
 
 import os
+import math
 import tempfile
 import fcntl
 import sys
 import subprocess
 import argparse
 
+# Imported first, so that the startup timings include the GTK import
+from sgtk_menu import timings
 import gi
 
 gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk, Gdk, GdkPixbuf
+from gi.repository import Gtk, Gdk, GLib
 import cairo
 
-from sgtk_menu.tools import (get_locale_string, config_dirs, load_json, save_json, create_default_configs, data_dirs,
-                             check_wm, display_geometry)
+from sgtk_menu.tools import (get_locale_string, config_dirs, create_default_configs, data_dirs,
+                             check_wm, install_window_rules, watch_window_rules, mouse_controller,
+                             wait_for_geometry)
+from sgtk_menu.entries import list_desktop_entries, DEFAULT_WORKERS
+from sgtk_menu.icons import load_pixbuf
+from sgtk_menu.search import SearchIndex
+from sgtk_menu.usage import load_counts, record_launch
+from sgtk_menu.spawn import spawn
 
-wm = check_wm()
+# Detected in main(), so that importing the module has no side effects
+wm = None
+mouse_pointer = None  # pynput mouse Controller, if available
 
-if wm == "sway":
-    var = subprocess.run(['swaymsg', 'for_window', '[title=\"~sgtk*\"]', 'floating', 'enable'],
-                         stdout=subprocess.DEVNULL).returncode == 0
-    var = subprocess.run(['swaymsg', 'for_window', '[title=\"~sgtk*\"]', 'border', 'none'],
-                         stdout=subprocess.DEVNULL).returncode == 0
-
-mouse_pointer = None
-if not wm == "sway":
-    try:
-        from pynput.mouse import Controller
-        mouse_pointer = Controller()
-    except:
-        pass
-
-# List to hold AppButtons for favourites
+# List to hold App objects for favourites
 all_favs = []
-# Lists to hold AppBoxes for apps found in .desktop files
+# List to hold App objects for apps found in .desktop files; AppBox widgets only get created for the visible ones
 all_apps = []
 
 localized_names_dictionary = {}  # name => translated name
@@ -59,29 +56,28 @@ all_items_list = []  # list of all DesktopMenuItem objects assigned to a .deskto
 all_copies_list = []  # list of copies of above used while searching (not assigned to a submenu!)
 menu_items_list = []  # created / updated with menu.get_children()
 filtered_items_list = []  # used in the search method
+search_index = None  # SearchIndex of all_apps, built on the first search
 
 # If we need to cheat_sway, we only add first args.t entries to all_copies list, but we need them all for searching!
 missing_copies_list = []
 
 config_dir = config_dirs()[0]
-if not os.path.exists(config_dir):
-    os.makedirs(config_dir)
 build_from_file = os.path.join(config_dirs()[0], 'appendix')
 
 if "XDG_CACHE_HOME" in os.environ:
     cache_dir = os.environ["XDG_CACHE_HOME"]
 else:
     cache_dir = os.path.join(os.path.expanduser('~/.cache'))
-if not os.path.exists(cache_dir):
-    os.makedirs(cache_dir)
 
 # We track clicks in the same cache file
 cache_file = os.path.join(cache_dir, 'sgtk-menu')
 cache = None
 sorted_cache = None
+pending_launches = []  # commands launched, but not yet recorded in the cache file
 
 
 def main():
+    timings.mark("imports")
     # exit if already running, thanks to Slava V at https://stackoverflow.com/a/384493/4040598
     pid_file = os.path.join(tempfile.gettempdir(), 'sgtk-grid.pid')
     fp = open(pid_file, 'w')
@@ -106,14 +102,32 @@ def main():
     parser.add_argument("-l", type=str, help="force language (e.g. \"de\" for German)")
     parser.add_argument("-s", type=int, default=72, help="menu icon size (min: 16, max: 96, default: 72)")
     parser.add_argument("-o", type=float, default=0.9, help="overlay opacity (min: 0.0, max: 1.0, default: 0.9)")
+    parser.add_argument("-j", type=int, default=DEFAULT_WORKERS,
+                        help="threads to parse .desktop files with (default: {})".format(DEFAULT_WORKERS))
     parser.add_argument("-css", type=str, default="grid.css",
                         help="use alternative {} style sheet instead of grid.css"
                         .format(os.path.join(config_dir, '<CSS>')))
+    parser.add_argument("--timings", type=str, nargs="?", const="-", metavar="FILE",
+                        help="print startup phase timings as JSON to stderr, or append them to FILE "
+                             "(or set ${})".format(timings.ENV_VAR))
     global args
     args = parser.parse_args()
+    timings.enable('sgtk-grid', args.timings)
+    timings.mark("args")
+
+    global wm, mouse_pointer
+    wm = check_wm()
+    timings.mark("wm")
+    install_window_rules(wm)
+    mouse_pointer = mouse_controller(wm)
+    timings.mark("wm_setup")
+
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
 
     # Create default config files if not found
     create_default_configs(config_dir)
+    timings.mark("configs")
 
     css_file = os.path.join(config_dirs()[0], args.css) if os.path.exists(
         os.path.join(config_dirs()[0], 'style.css')) else None
@@ -132,15 +146,14 @@ def main():
                 screen, provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
         except Exception as e:
             print(e)
+    timings.mark("css")
 
     # cache stores number of clicks on each item
     global cache
-    cache = load_json(cache_file)
-
-    if not cache:
-        save_json(cache, cache_file)
+    cache = load_counts(cache_file)
     global sorted_cache
     sorted_cache = sorted(cache.items(), reverse=True, key=lambda x: x[1])
+    timings.mark("cache")
 
     global locale
     locale = get_locale_string(args.l)
@@ -154,44 +167,37 @@ def main():
 
     # find all .desktop entries, create AppButton class instances;
     list_entries()
+    timings.mark("list_entries")
 
     # find favourites in the list above
     if args.f or args.fn > 0:
         list_favs()
+        timings.mark("list_favs")
 
     # Overlay window
     global win
     win = MainWindow()
+    # in case `swaymsg reload` dropped the rules installed above
+    watch_window_rules(win, wm)
+    timings.mark("window")
 
-    geometry = (0, 0, 0, 0)
-    # If we're not on sway neither i3, this won't return values until the window actually shows up.
-    # Let's try as many times as needed. The retries int protects from an infinite loop.
-    retries = 0
-    while geometry[0] == 0 and geometry[1] == 0 and geometry[2] == 0 and geometry[3] == 0:
-        geometry = display_geometry(win, wm, mouse_pointer)
-        retries += 1
-        if retries > 50:
-            print("\nFailed to get the current screen geometry, exiting...\n")
-            sys.exit(2)
+    geometry = wait_for_geometry(win, wm, mouse_pointer)
+    if not geometry:
+        print("\nFailed to get the current screen geometry, exiting...\n")
+        sys.exit(2)
     x, y, w, h = geometry
+    timings.mark("geometry")
 
     if wm == "sway":
         win.resize(w, h)
 
-    # align width of all buttons
-    max_width = 0
-    for item in all_apps:
-        width = item.get_allocated_width()
-        if width > max_width:
-            max_width = width
-    for item in all_favs:
-        item.set_size_request(max_width, max_width / 2)
-    for item in all_apps:
-        item.set_size_request(max_width, max_width / 2)
-    win.search_box.set_size_request(max_width, 0)
+    # all the tiles have the same size (see ApplicationGrid)
+    win.search_box.set_size_request(win.grid_apps.tile_size[0], 0)
     if all_favs:
         win.sep1.set_size_request(w / 3, 1)
+    timings.mark("layout")
 
+    win.connect("map-event", timings.first_shown("map"))
     win.show_all()
     # If done inside the constructor on Openbox, stops the window from grabbing focus!
     win.set_skip_taskbar_hint(True)
@@ -201,6 +207,8 @@ def main():
 
     Gtk.main()
 
+    record_pending_launches()
+
 
 class MainWindow(Gtk.Window):
     def __init__(self):
@@ -242,9 +250,12 @@ class MainWindow(Gtk.Window):
         vbox = Gtk.VBox()
         vbox.set_spacing(15)
 
+        # favourites and apps share the tile size, so that their columns are aligned
+        tile_size = measure_tile(all_apps)
+
         if all_favs:
             hbox0 = Gtk.HBox()
-            self.grid_favs = ApplicationGrid(all_favs, columns=args.c)
+            self.grid_favs = ApplicationGrid(all_favs, tile_size, columns=args.c)
             hbox0.pack_start(self.grid_favs, True, False, 0)
             vbox.pack_start(hbox0, False, False, 0)
 
@@ -258,7 +269,7 @@ class MainWindow(Gtk.Window):
             self.sep1 = None
 
         self.hbox1 = Gtk.HBox()
-        self.grid_apps = ApplicationGrid(all_apps, columns=args.c)
+        self.grid_apps = ApplicationGrid(all_apps, tile_size, columns=args.c)
         self.hbox1.pack_start(self.grid_apps, True, False, 0)
         vbox.pack_start(self.hbox1, False, False, 0)
 
@@ -266,6 +277,10 @@ class MainWindow(Gtk.Window):
         scrolled_window.set_propagate_natural_height(True)
         scrolled_window.set_policy(Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.ALWAYS)
         scrolled_window.add(vbox)
+        # grids only create tiles for what's visible, so they need to know where we're scrolled to
+        for grid in [self.grid_favs, self.grid_apps]:
+            if grid:
+                grid.set_vadjustment(scrolled_window.get_vadjustment())
 
         outer_box.pack_start(scrolled_window, True, True, 0)
 
@@ -311,18 +326,10 @@ class MainWindow(Gtk.Window):
 
             if update:
                 if len(self.search_phrase) > 0:
-                    filtered_items_list = []
-                    for item in all_apps:
-                        # We'll search the entry name and the first element of its command (to skip arguments)
-                        if self.search_phrase.upper() in item.name.upper() or self.search_phrase.upper() in \
-                                item.exec.split()[0].upper():
-                            # avoid adding twice
-                            found = False
-                            for i in filtered_items_list:
-                                if i.name == item.name:
-                                    found = True
-                            if not found:
-                                filtered_items_list.append(item)
+                    global search_index
+                    if not search_index:
+                        search_index = SearchIndex(all_apps, counts=cache)
+                    filtered_items_list = search_index.search(self.search_phrase)
                     self.grid_apps.update(filtered_items_list)
                 else:
                     self.grid_apps.update(all_apps)
@@ -331,7 +338,9 @@ class MainWindow(Gtk.Window):
                 self.search_box.set_text('Type to search')
 
             if len(filtered_items_list) == 1:
-                filtered_items_list[0].button.set_property("has-focus", True)
+                tile = self.grid_apps.tile(0)
+                if tile:
+                    tile.button.set_property("has-focus", True)
 
         return True
 
@@ -354,65 +363,18 @@ def list_entries():
             paths=[args.d]
         else:
             paths=args.d.split(':')
-    for path in paths:
-        if os.path.exists(path):
-            for f in os.listdir(path):
-                _name, _exec, _icon, _comment = '', '', '', ''
-                try:
-                    with open(os.path.join(path, f)) as d:
-                        lines = d.readlines()
-                        read_me = True
-                        for line in lines:
-                            if line.startswith("["):
-                                read_me = line.strip() == "[Desktop Entry]"
-                                continue
-                            if read_me:
-                                loc_name = 'Name{}='.format(locale)
-
-                                if line.startswith('Name='):
-                                    _name = line.split('=')[1].strip()
-                                    continue
-
-                                if line.startswith(loc_name):
-                                    _name = line.split('=')[1].strip()
-                                    continue
-
-                                loc_comment = 'Comment{}='.format(locale)
-
-                                if line.startswith('Comment='):
-                                    _comment = line.split('=')[1].strip()
-                                    continue
-
-                                if line.startswith(loc_comment):
-                                    _comment = line.split('=')[1].strip()
-                                    continue
-
-                                if line.startswith('Exec='):
-                                    cmd = line.split('=')[1:]
-                                    c = '='.join(cmd)
-                                    _exec = c.strip()
-                                    if '%' in _exec:
-                                        _exec = _exec.split('%')[0].strip()
-                                    continue
-
-                                if line.startswith('Icon='):
-                                    _icon = line.split('=')[1].strip()
-
-                        if _name and _exec and _icon:
-                            # avoid adding twice
-                            found = False
-                            for item in apps:
-                                if item[0] == _name and item[1] == _exec:
-                                    found = True
-                            if not found:
-                                apps.append((_name, _exec, _icon, _comment))
-                
-                except Exception as e:
-                    print(e)
+    found = set()
+    for item in list_desktop_entries(paths, locale, cache_dir, workers=args.j):
+        _name, _exec, _icon, _comment = item["name"], item["exec"], item["icon"], item["comment"]
+        if _name and _exec and _icon:
+            # avoid adding twice
+            if (_name, _exec) not in found:
+                found.add((_name, _exec))
+                apps.append((_name, _exec, _icon, _comment))
 
     apps = sorted(apps, key=lambda x: x[0].upper())
     for item in apps:
-        all_apps.append(AppBox(item[0], item[1], item[2], item[3]))
+        all_apps.append(App(item[0], item[1], item[2], item[3]))
 
 
 def list_favs():
@@ -434,101 +396,209 @@ def list_favs():
                 if button.exec == fav_exec and button not in to_prepend:
                     to_prepend.append(button)
                     break  # stop searching, there may be duplicates on the list
-        for button in to_prepend:
-            all_favs.append(AppBox(button.name, button.exec, button.icon, button.comment))
+        # App objects are just data, so we don't need copies
+        all_favs.extend(to_prepend)
 
 
-class AppBox(Gtk.EventBox):
+class App(object):
+    """
+    Application found in .desktop files
+    """
+
     def __init__(self, name, _exec, icon, comment):
-        super().__init__()
         self.name = name
         self.exec = _exec
         self.icon = icon
         self.comment = comment
-        if len(name) > 25:
-            name = "{}...".format(name[:22])
+
+
+class AppBox(Gtk.EventBox):
+    """
+    Tile, which we can (re)assign to any App; see ApplicationGrid
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.name = None
+        self.exec = None
+        self.icon = None
+        self.comment = None
+        self.app = None  # App displayed
+        self.index = None  # index of the App in the grid items list, None if hidden
         box = Gtk.Box()
         # box.set_property("name", "button")
 
         self.connect("enter-notify-event", on_button_focused)
 
+        self.image = Gtk.Image()
         self.button = Gtk.Button()
         self.button.set_property("name", "button")
         self.button.set_always_show_image(True)
-        self.button.set_image(app_image(icon))
+        self.button.set_image(self.image)
         self.button.set_image_position(Gtk.PositionType.TOP)
-        self.button.set_label(name)
-        self.button.connect("clicked", launch, _exec)
+        self.button.connect("clicked", self.launch)
         self.connect("focus", on_button_focused)
         self.connect("proximity-in-event", on_button_focused)
         box.pack_start(self.button, True, True, 5)
         self.add(box)
 
+    def bind(self, app):
+        self.app = app
+        self.name = app.name
+        self.exec = app.exec
+        self.comment = app.comment
+        name = app.name
+        if len(name) > 25:
+            name = "{}...".format(name[:22])
+        self.button.set_label(name)
+        if app.icon != self.icon:
+            self.icon = app.icon
+            self.image.set_from_pixbuf(load_pixbuf(app.icon, args.s))
+
+    def launch(self, button):
+        launch(button, self.exec)
+
 
-def app_image(icon):
+def measure_tile(apps):
     """
-    Creates a Gtk.Image instance
-    :param icon: sys icon name or .svg / png path
-    :return: Gtk.Image
+    :return: (width, height) of a tile big enough for any of the apps
     """
-    image = None
-    icon_theme = Gtk.IconTheme.get_default()
-    if icon.startswith('/'):
-        try:
-            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(icon, args.s, args.s)
-            image = Gtk.Image.new_from_pixbuf(pixbuf)
-        except:
-            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(os.path.join(config_dir, 'icon-missing.svg'), args.s,
-                                                            args.s)
-            image = Gtk.Image.new_from_pixbuf(pixbuf)
-    else:
-        try:
-            if icon.endswith('.svg') or icon.endswith('.png'):
-                icon = icon.split('.')[0]
-            pixbuf = icon_theme.load_icon(icon, args.s, Gtk.IconLookupFlags.FORCE_SIZE)
-            image = Gtk.Image.new_from_pixbuf(pixbuf)
-        except:
-            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(os.path.join(config_dir, 'icon-missing.svg'), args.s,
-                                                            args.s)
-            image = Gtk.Image.new_from_pixbuf(pixbuf)
-    return image
-
-
-class ApplicationGrid(Gtk.Grid):
-    def __init__(self, items_list, columns=6):
+    tile = AppBox()
+    width, height = args.s, args.s
+    # Labels are at most 25 characters long; the longest ones need the most space
+    for app in sorted(apps, key=lambda x: len(x.name), reverse=True)[:10]:
+        tile.bind(app)
+        minimum, natural = tile.get_preferred_size()
+        width, height = max(width, natural.width), max(height, natural.height)
+    tile.destroy()
+    return width, height
+
+
+class ApplicationGrid(Gtk.Fixed):
+    """
+    Virtualized grid: it's as big as all the items would need, but only holds a pool of AppBox tiles to cover
+    the visible rows, plus OVERSCAN rows above and below. All the tiles have the same size.
+    Whenever the visible sequence changes (scrolling, new search results), we diff it against what the tiles display:
+    a tile whose item is still in sight keeps it, and only moves if the item's position has changed; tiles of items
+    gone out of sight get the new ones. A tile also keeps its item while hidden, in case it comes back (backspace).
+    """
+    OVERSCAN = 2
+    COLUMN_SPACING = 25
+    ROW_SPACING = 15
+
+    def __init__(self, items_list, tile_size, columns=6):
         super().__init__()
-        self.set_column_spacing(25)
-        self.set_row_spacing(15)
         self.items_list = items_list
+        self.tile_size = tile_size
         self.columns = columns
-        col, row = 0, 0
-        for item in self.items_list:
-            if not item.get_parent():  # check if not yet attached (e.g. in favourites)
-                self.attach(item, col, row, 1, 1)
-                if col < self.columns - 1:
-                    col += 1
-                else:
-                    col = 0
-                    row += 1
-
-    def update(self, items_list):
-        for item in all_favs:
+        self.pool = []
+        self.vadjustment = None
+        self.refresh_pending = False
+        self.connect("size-allocate", self.queue_refresh)
+        self.update(items_list)
+
+    def set_vadjustment(self, vadjustment):
+        self.vadjustment = vadjustment
+        self.set_focus_vadjustment(vadjustment)
+        vadjustment.connect("value-changed", self.refresh)
+        vadjustment.connect("changed", self.queue_refresh)
+
+    def clear_state_flags(self):
+        for item in self.pool:
+            # indicates if the widget has a mouse pointer over it
             item.button.unset_state_flags(Gtk.StateFlags.PRELIGHT)
             item.button.unset_state_flags(Gtk.StateFlags.SELECTED)
             item.button.unset_state_flags(Gtk.StateFlags.FOCUSED)
-        for item in self.get_children():
-            self.remove(item)
-            # indicates if the widget has a mouse pointer over it
-            item.button.unset_state_flags(Gtk.StateFlags.PRELIGHT)
-        col, row = 0, 0
-        for item in items_list:
-            if not item.get_parent():  # check if not yet attached (e.g. in favourites)
-                self.attach(item, col, row, 1, 1)
-                if col < self.columns - 1:
-                    col += 1
-                else:
-                    col = 0
-                    row += 1
+
+    def update(self, items_list):
+        self.clear_state_flags()
+        # favourites get hidden or shown again while we search: they must not keep the state either
+        if win and win.grid_favs and win.grid_favs is not self:
+            win.grid_favs.clear_state_flags()
+        self.items_list = items_list
+        rows = math.ceil(len(items_list) / self.columns)
+        columns = min(len(items_list), self.columns)
+        size = (max(0, columns * (self.tile_size[0] + self.COLUMN_SPACING) - self.COLUMN_SPACING),
+                max(0, rows * (self.tile_size[1] + self.ROW_SPACING) - self.ROW_SPACING))
+        # Resizing means relayout of the whole window, so only do it when needed
+        if size != tuple(self.get_size_request()):
+            self.set_size_request(*size)
+        self.refresh()
+
+    def visible_rows(self):
+        """
+        :return: (first, last + 1) rows of the items list to display, including OVERSCAN
+        """
+        row_height = self.tile_size[1] + self.ROW_SPACING
+        if self.vadjustment and self.vadjustment.get_page_size() > 0:
+            top = self.vadjustment.get_value() - self.get_allocation().y
+            height = self.vadjustment.get_page_size()
+        else:
+            # not allocated yet
+            top, height = 0, self.get_screen().get_height()
+        first = max(0, int(top // row_height) - self.OVERSCAN)
+        return first, first + math.ceil(height / row_height) + 2 * self.OVERSCAN + 1
+
+    def queue_refresh(self, *args):
+        # We must not add nor move children while being allocated
+        if not self.refresh_pending:
+            self.refresh_pending = True
+            GLib.idle_add(self.refresh)
+
+    def refresh(self, *args):
+        self.refresh_pending = False
+        first, last = self.visible_rows()
+        needed = min(len(self.items_list), (last - first) * self.columns)
+        while len(self.pool) < needed:
+            tile = AppBox()
+            tile.set_size_request(self.tile_size[0], self.tile_size[1])
+            tile.show_all()
+            # we show and hide tiles ourselves
+            tile.set_no_show_all(True)
+            self.put(tile, 0, 0)
+            self.pool.append(tile)
+        if not self.pool:
+            return False
+
+        start = first * self.columns
+        end = min(len(self.items_list), start + len(self.pool))
+        start = max(0, end - len(self.pool))
+        # item => its new index
+        wanted = {self.items_list[i]: i for i in range(start, end)}
+        bound = {}  # item => tile which displays it
+        free = []
+        for tile in self.pool:
+            if tile.app in wanted:
+                bound[tile.app] = tile
+            else:
+                free.append(tile)
+
+        for item, i in wanted.items():
+            tile = bound.get(item)
+            if not tile:
+                tile = free.pop()
+                tile.bind(item)
+            if tile.index != i:
+                tile.index = i
+                self.move(tile, (i % self.columns) * (self.tile_size[0] + self.COLUMN_SPACING),
+                          (i // self.columns) * (self.tile_size[1] + self.ROW_SPACING))
+            if not tile.get_visible():
+                tile.show()
+        for tile in free:
+            if tile.get_visible():
+                tile.index = None
+                tile.hide()
+        # in case we were called from an idle callback
+        return False
+
+    def tile(self, index):
+        """
+        :return: AppBox displaying the item of given index, or None if not displayed
+        """
+        for tile in self.pool:
+            if tile.index == index:
+                return tile
+        return None
 
 
 def on_button_focused(button, event):
@@ -539,17 +609,23 @@ def on_button_focused(button, event):
 
 
 def launch(item, command, no_cache=False):
+    # run the command first; bookkeeping waits until our window is gone
+    spawn(command)
+    win.hide()
     if not no_cache:
-        # save command and increased clicks counter to the cache file; we won't cache items from the user-defined menu
-        if command not in cache:
-            cache[command] = 1
-        else:
-            cache[command] += 1
-        save_json(cache, cache_file)
-    # run the command an quit
-    subprocess.Popen('exec {}'.format(command), shell=True)
+        # we won't cache items from the user-defined menu
+        pending_launches.append(command)
     Gtk.main_quit()
 
 
+def record_pending_launches():
+    """
+    Logs launched commands, to increase their clicks counters in the cache file
+    """
+    for command in pending_launches:
+        record_launch(cache_file, command)
+    del pending_launches[:]
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Frecency history of commands run from sgtk-dmenu.
+
+Each command has a score, which grows by 1 on each run, and halves every HALF_LIFE seconds; this way frequently
+and recently run commands go first. The file (JSON: command => [score, time of last update]) keeps MAX_ENTRIES
+commands at most: on overflow we drop the ones with the lowest current score.
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+import os
+import time
+
+from sgtk_menu.tools import load_json, save_json
+
+# Seconds: a command run a week ago counts half as much as one run now
+HALF_LIFE = 7 * 24 * 3600
+MAX_ENTRIES = 500
+
+
+def history_file(cache_dir):
+    return os.path.join(cache_dir, 'sgtk-dmenu-history')
+
+
+def load_history(path):
+    """
+    :return: dictionary: command => [score, time of last update]
+    """
+    history = load_json(path) if os.path.isfile(path) else {}
+    return history if isinstance(history, dict) else {}
+
+
+def decayed(record, now):
+    score, timestamp = record
+    return score * 0.5 ** (max(0, now - timestamp) / HALF_LIFE)
+
+
+def frecency(path, now=None):
+    """
+    :return: dictionary: command => current score
+    """
+    now = now or time.time()
+    scores = {}
+    for command, record in load_history(path).items():
+        try:
+            scores[command] = decayed(record, now)
+        except (TypeError, ValueError):
+            pass
+    return scores
+
+
+def record_runs(path, commands, now=None):
+    """
+    Adds runs of the commands to the history, and evicts the least valuable entries over MAX_ENTRIES
+    """
+    now = now or time.time()
+    history = {}
+    for command, score in frecency(path, now).items():
+        history[command] = [score, now]
+    for command in commands:
+        score = history[command][0] if command in history else 0
+        history[command] = [score + 1, now]
+    if len(history) > MAX_ENTRIES:
+        kept = sorted(history, key=lambda c: history[c][0], reverse=True)[:MAX_ENTRIES]
+        history = {command: history[command] for command in kept}
+    for record in history.values():
+        record[0] = round(record[0], 4)
+    try:
+        save_json(history, path, indent=None)
+    except Exception as e:
+        print(e)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Icon loading shared by all the launchers, with an on-disk cache of already scaled pixel buffers.
+
+Rasterizing (mostly SVG) icons at the requested size is one of the most expensive things we do on start.
+Scaled pixels are stored raw in $XDG_CACHE_HOME/sgtk-menu-icons/<theme>-<stamp>/, where the stamp changes
+whenever the icon theme (or the hicolor fallback theme) gets updated. Warm starts just wrap the stored bytes.
+
+Within a process, pixel buffers are shared between all the widgets showing the same icon at the same size:
+they're never modified, so one instance is enough. The pool keeps the most recently used ones up to a memory
+budget, so that a resident instance does not grow without bound. The icon-missing fallback is loaded once per size.
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+import os
+import shutil
+import struct
+import hashlib
+from collections import OrderedDict
+
+import gi
+
+gi.require_version('Gtk', '3.0')
+from gi.repository import Gtk, GdkPixbuf, GLib
+
+from sgtk_menu.tools import config_dirs, cache_home
+
+# magic, width, height, rowstride, has_alpha
+HEADER = struct.Struct('<4sIIII')
+MAGIC = b'SGPX'
+
+cache_root = os.path.join(cache_home(), 'sgtk-menu-icons')
+theme_cache_dir = None  # subdirectory for the current theme state, see icon_cache_dir()
+
+DEFAULT_POOL_BUDGET = 16  # MB
+pool_budget = DEFAULT_POOL_BUDGET * 1024 * 1024  # bytes
+pool = OrderedDict()  # (icon, size) => GdkPixbuf.Pixbuf, or None if not found; least recently used first
+pool_bytes = 0
+fallbacks = {}  # size => icon-missing GdkPixbuf.Pixbuf
+
+
+def theme_stamp(icon_theme, theme_name):
+    """
+    :return: the newest mtime of icon theme directories and their icon caches (0 if none found)
+    """
+    stamp = 0
+    for d in icon_theme.get_search_path():
+        for path in [d, os.path.join(d, theme_name), os.path.join(d, theme_name, 'icon-theme.cache'),
+                     os.path.join(d, 'hicolor', 'icon-theme.cache')]:
+            try:
+                stamp = max(stamp, os.stat(path).st_mtime_ns)
+            except OSError:
+                pass
+    return stamp
+
+
+def icon_cache_dir(icon_theme):
+    """
+    :return: cache subdirectory for the current icon theme and its state
+    """
+    global theme_cache_dir
+    if theme_cache_dir is None:
+        theme_name = Gtk.Settings.get_default().get_property("gtk-icon-theme-name") or 'hicolor'
+        theme_cache_dir = os.path.join(cache_root, '{}-{}'.format(theme_name.replace('/', '_'),
+                                                                  theme_stamp(icon_theme, theme_name)))
+    return theme_cache_dir
+
+
+def cache_key(icon, size):
+    if icon.startswith('/'):
+        try:
+            mtime = os.stat(icon).st_mtime_ns
+        except OSError:
+            mtime = 0
+        key = '{}\0{}\0{}'.format(icon, size, mtime)
+    else:
+        key = '{}\0{}'.format(icon, size)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def read_cached(path):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, width, height, rowstride, has_alpha = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            return None
+        pixels = GLib.Bytes.new(data[HEADER.size:])
+        return GdkPixbuf.Pixbuf.new_from_bytes(pixels, GdkPixbuf.Colorspace.RGB, bool(has_alpha), 8, width, height,
+                                               rowstride)
+    except Exception:
+        return None
+
+
+def remove_stale(directory):
+    """
+    New theme state: forgets pixels rendered for the previous states of the same theme. Other themes' directories
+    are left alone, as another launcher may be using them.
+    :param directory: <theme>-<stamp> directory in cache_root
+    """
+    theme, sep, stamp = os.path.basename(directory).rpartition('-')
+    try:
+        names = os.listdir(os.path.dirname(directory))
+    except OSError:
+        return
+    for name in names:
+        # the theme name may contain '-', e.g. Papirus-Dark: the stamp is what follows the last one
+        other_theme, sep, other_stamp = name.rpartition('-')
+        if other_theme == theme and other_stamp.isdigit():
+            shutil.rmtree(os.path.join(os.path.dirname(directory), name), ignore_errors=True)
+
+
+def write_cached(path, pixbuf):
+    directory = os.path.dirname(path)
+    try:
+        if not os.path.isdir(directory):
+            remove_stale(directory)
+            os.makedirs(directory, exist_ok=True)
+        header = HEADER.pack(MAGIC, pixbuf.get_width(), pixbuf.get_height(), pixbuf.get_rowstride(),
+                             int(pixbuf.get_has_alpha()))
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            f.write(pixbuf.read_pixel_bytes().get_data())
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(e)
+
+
+def render(icon, size, icon_theme):
+    """
+    :return: GdkPixbuf.Pixbuf rendered from a file or the icon theme; exception if not found
+    """
+    if icon.startswith('/'):
+        return GdkPixbuf.Pixbuf.new_from_file_at_size(icon, size, size)
+    if icon.endswith('.svg') or icon.endswith('.png'):
+        icon = icon.split('.')[0]
+    return icon_theme.load_icon(icon, size, Gtk.IconLookupFlags.FORCE_SIZE)
+
+
+def set_pool_budget(megabytes):
+    """
+    :param megabytes: how much memory pixel buffers kept in the pool may take
+    """
+    global pool_budget
+    pool_budget = max(0, megabytes) * 1024 * 1024
+    evict()
+
+
+def pixbuf_bytes(pixbuf):
+    return pixbuf.get_rowstride() * pixbuf.get_height() if pixbuf else 0
+
+
+def evict(keep=None):
+    """
+    Drops the least recently used pixel buffers until the pool fits in the budget
+    :param keep: key not to drop, even if it alone exceeds the budget
+    """
+    global pool_bytes
+    for key in list(pool):
+        if pool_bytes <= pool_budget:
+            break
+        if key != keep:
+            pool_bytes -= pixbuf_bytes(pool.pop(key))
+
+
+def fallback_pixbuf(size):
+    """
+    :return: icon-missing GdkPixbuf.Pixbuf, loaded once per size
+    """
+    if size not in fallbacks:
+        fallbacks[size] = GdkPixbuf.Pixbuf.new_from_file_at_size(os.path.join(config_dirs()[0], 'icon-missing.svg'),
+                                                                 size, size)
+    return fallbacks[size]
+
+
+def find_pixbuf(icon, size):
+    """
+    :return: GdkPixbuf.Pixbuf from the on-disk cache, or rendered from a file or the icon theme; None if not found
+    """
+    icon_theme = Gtk.IconTheme.get_default()
+    path = os.path.join(icon_cache_dir(icon_theme), cache_key(icon, size))
+    pixbuf = read_cached(path)
+    if pixbuf:
+        return pixbuf
+    try:
+        pixbuf = render(icon, size, icon_theme)
+        write_cached(path, pixbuf)
+        return pixbuf
+    except Exception:
+        return None
+
+
+def load_pixbuf(icon, size, fallback=True):
+    """
+    :param icon: sys icon name or .svg / png path
+    :param size: icon size in px
+    :param fallback: if the icon is not found, return icon-missing instead of None
+    :return: GdkPixbuf.Pixbuf, shared with other callers: don't modify it
+    """
+    global pool_bytes
+    pixbuf = None
+    if icon:
+        key = (icon, size)
+        if key in pool:
+            pool.move_to_end(key)
+            pixbuf = pool[key]
+        else:
+            pixbuf = find_pixbuf(icon, size)
+            pool[key] = pixbuf
+            pool_bytes += pixbuf_bytes(pixbuf)
+            evict(keep=key)
+    if pixbuf:
+        return pixbuf
+    return fallback_pixbuf(size) if fallback else None
+
+
+def load_image(icon, size, fallback=True):
+    """
+    :return: Gtk.Image, or None if the icon is not found and fallback is False
+    """
+    pixbuf = load_pixbuf(icon, size, fallback)
+    return Gtk.Image.new_from_pixbuf(pixbuf) if pixbuf else None
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Minimal client of the i3 / sway IPC, see https://i3wm.org/docs/ipc.html
+
+We used to spawn swaymsg / i3-msg for every query and command. Now all of them go over a single connection
+to $SWAYSOCK / $I3SOCK, which we open on the first request and keep for the life of the process.
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+import os
+import json
+import socket
+import struct
+
+MAGIC = b'i3-ipc'
+# magic string, payload length, message type; integers in native byte order
+HEADER = struct.Struct('=6sII')
+
+RUN_COMMAND = 0
+GET_WORKSPACES = 1
+GET_OUTPUTS = 3
+GET_TREE = 4
+GET_VERSION = 7
+GET_SEATS = 101  # sway only
+
+connection = None  # shared Connection, see get_connection()
+
+
+class IPCError(Exception):
+    pass
+
+
+class Connection(object):
+    def __init__(self, path, timeout=2):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        try:
+            self.socket.connect(path)
+        except OSError:
+            self.socket.close()
+            raise
+
+    def receive(self, length):
+        data = b''
+        while len(data) < length:
+            chunk = self.socket.recv(length - len(data))
+            if not chunk:
+                raise IPCError("connection closed by the window manager")
+            data += chunk
+        return data
+
+    def request(self, message_type, payload=''):
+        """
+        :return: decoded JSON reply
+        """
+        data = payload.encode()
+        self.socket.sendall(HEADER.pack(MAGIC, len(data), message_type) + data)
+        magic, length, reply_type = HEADER.unpack(self.receive(HEADER.size))
+        if magic != MAGIC or reply_type != message_type:
+            raise IPCError("unexpected reply")
+        return json.loads(self.receive(length).decode())
+
+    def close(self):
+        self.socket.close()
+
+
+def socket_path(wm=None):
+    """
+    :param wm: if the environment does not tell, ask this WM binary ('sway' or 'i3') for the socket path
+    :return: path to the IPC socket, or None
+    """
+    path = os.getenv("SWAYSOCK") or os.getenv("I3SOCK")
+    if not path and wm in ["sway", "i3"]:
+        import subprocess
+        try:
+            path = subprocess.run([wm, '--get-socketpath'], stdout=subprocess.PIPE,
+                                  stderr=subprocess.DEVNULL).stdout.decode().strip()
+        except Exception:
+            path = None
+    return path or None
+
+
+def get_connection(wm=None):
+    """
+    :return: shared Connection, or None if there's no IPC to talk to
+    """
+    global connection
+    if connection is None:
+        path = socket_path(wm)
+        if path:
+            try:
+                connection = Connection(path)
+            except OSError:
+                pass
+    return connection
+
+
+def request(message_type, payload='', wm=None):
+    """
+    :return: decoded reply, or None on failure
+    """
+    global connection
+    c = get_connection(wm)
+    if not c:
+        return None
+    try:
+        return c.request(message_type, payload)
+    except (OSError, ValueError, IPCError) as e:
+        print(e)
+        # don't reuse the broken connection
+        c.close()
+        connection = None
+        return None
+
+
+def run_commands(*commands, wm=None):
+    """
+    Runs all the commands in a single round-trip
+    :return: list of results, one per command, or None on failure
+    """
+    return request(RUN_COMMAND, '; '.join(commands), wm=wm)
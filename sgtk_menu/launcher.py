@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Entry point of sgtk-menu.
+
+If a resident instance (sgtk-menu --daemon) started with the same arguments is running, it only needs to be told
+to pop its menu up. So we parse arguments and try that first, with nothing but the standard library: GTK gets
+imported, and the window manager detected, only if no daemon takes over.
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+# Imported first, so that the startup timings include everything
+from sgtk_menu import timings
+
+import os
+import sys
+import json
+import argparse
+
+from sgtk_menu.tools import config_dirs
+from sgtk_menu.entries import DEFAULT_WORKERS
+from sgtk_menu.daemon import send_command
+
+# Arguments which do not change what the menu looks like, nor how it behaves
+INSTANCE_ARGS = ['daemon', 'timings', 'version', 'wm', 'j', 'icon_pool']
+
+
+def read_pipe():
+    """
+    :return: list of lines piped to stdin (see the pipe menu in examples), or None if stdin is a terminal
+    """
+    if sys.stdin.isatty():
+        return None
+    return [line.rstrip() for line in sys.stdin]
+
+
+def parse_args():
+    config_dir = config_dirs()[0]
+    parser = argparse.ArgumentParser(description="GTK menu for sway, i3 and some other WMs")
+    placement = parser.add_mutually_exclusive_group()
+    placement.add_argument("-b", "--bottom", action="store_true", help="display menu at the bottom")
+    placement.add_argument("-c", "--center", action="store_true", help="center menu on the screen")
+    placement.add_argument("-p", "--pointer", action="store_true", help="display at mouse pointer (not-sway only)")
+
+    favourites = parser.add_mutually_exclusive_group()
+    favourites.add_argument("-f", "--favourites", action="store_true", help="prepend 5 most used items")
+    favourites.add_argument('-fn', type=int, help="prepend <FN> most used items")
+
+    appendix = parser.add_mutually_exclusive_group()
+    appendix.add_argument("-a", "--append", action="store_true",
+                          help="append custom menu from {}".format(os.path.join(config_dir, 'appendix')))
+    appendix.add_argument("-af", type=str, help="append custom menu from {}".format(os.path.join(config_dir, '<AF>')))
+
+    parser.add_argument("-n", "--no-menu", action="store_true", help="skip menu, display appendix only")
+    parser.add_argument("-l", type=str, help="force language (e.g. \"de\" for German)")
+    parser.add_argument("-s", type=int, default=20, help="menu icon size (min: 16, max: 48, default: 20)")
+    parser.add_argument("-w", type=int, help="menu width in px (integer, default: screen width / 8)")
+    parser.add_argument("-d", type=int, default=100, help="menu delay in milliseconds (default: 100; sway & i3 only)")
+    parser.add_argument("-o", type=float, default=0.3,
+                        help="overlay opacity (min: 0.0, max: 1.0, default: 0.3; sway only)")
+    parser.add_argument("-t", type=int, default=30,
+                        help="sway submenu lines limit, and max number of search results (default: 30)")
+    parser.add_argument("-y", type=int, default=0, help="y offset from edge to display menu at")
+    parser.add_argument("-j", type=int, default=DEFAULT_WORKERS,
+                        help="threads to parse .desktop files with (default: {})".format(DEFAULT_WORKERS))
+    parser.add_argument("-css", type=str, default="style.css",
+                        help="use alternative {} style sheet instead of style.css"
+                        .format(os.path.join(config_dir, '<CSS>')))
+    parser.add_argument("-v", "--version", action="store_true", help="display version and exit")
+    parser.add_argument("-wm", action="store_true", help="display detected Window Manager and exit")
+    parser.add_argument("--daemon", action="store_true",
+                        help="stay resident, and pop the menu up whenever sgtk-menu is run again (or on SIGUSR1)")
+    # None for icons.DEFAULT_POOL_BUDGET: the icons module imports GTK
+    parser.add_argument("--icon-pool", type=int, metavar="MB", help="memory to keep icons in, in MB (default: 16)")
+    parser.add_argument("--timings", type=str, nargs="?", const="-", metavar="FILE",
+                        help="print startup phase timings as JSON to stderr, or append them to FILE "
+                             "(or set ${})".format(timings.ENV_VAR))
+    return parser.parse_args()
+
+
+def menu_config(args):
+    """
+    :return: JSON string of the arguments which shape the menu, as given on the command line
+    """
+    return json.dumps({key: value for key, value in vars(args).items() if key not in INSTANCE_ARGS}, sort_keys=True)
+
+
+def main():
+    pipe_menu = read_pipe()
+    args = parse_args()
+    timings.enable('sgtk-menu', args.timings)
+    timings.mark("args")
+
+    config = menu_config(args)
+    if not (args.daemon or args.version or args.wm or pipe_menu) and send_command(
+            'sgtk-menu', 'show {}'.format(config)) == 'ok':
+        sys.exit(0)
+    timings.mark("handover")
+
+    from sgtk_menu import menu
+    menu.main(args, pipe_menu, config)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,48 +16,41 @@ import os
 import tempfile
 import fcntl
 import sys
-import subprocess
-import argparse
+import signal
 import json
 
+# Imported first, so that the startup timings include the GTK import
+from sgtk_menu import timings
 import gi
 
 
 gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk, Gdk, GdkPixbuf, GLib
+from gi.repository import Gtk, Gdk, GLib
 import cairo
 
 from sgtk_menu.tools import (
     localized_category_names, additional_to_main, get_locale_string,
-    config_dirs, load_json, save_json, create_default_configs, check_wm,
-    display_geometry, data_dirs, print_version)
-
-wm = check_wm()
+    config_dirs, load_json, create_default_configs, check_wm, install_window_rules, mouse_controller,
+    watch_window_rules, wait_for_geometry, data_dirs, print_version)
+from sgtk_menu.categories import DesktopEntry, Categories, CATEGORY_NAMES
+from sgtk_menu.entries import list_desktop_entries, desktop_entries_state
+from sgtk_menu.daemon import listen
+from sgtk_menu.icons import load_image, load_pixbuf, set_pool_budget
+from sgtk_menu.search import SearchIndex
+from sgtk_menu.usage import load_counts, record_launch
+from sgtk_menu.spawn import spawn
+
+# Detected in main(), so that importing the module has no side effects
+wm = None
+other_wm = False
+mouse_pointer = None  # pynput mouse Controller, if available
 pipe_menu = None
 
-# This will apply to the overlay window, as setting the window type POPUP does not impress sway :)
-if wm == "sway":
-    var = subprocess.run(['swaymsg', 'for_window', '[title=\"~sgtk*\"]', 'floating', 'enable'],
-                         stdout=subprocess.DEVNULL).returncode == 0
-    var = subprocess.run(['swaymsg', 'for_window', '[title=\"~sgtk*\"]', 'border', 'none'],
-                         stdout=subprocess.DEVNULL).returncode == 0
-
-other_wm = not wm == "sway" and not wm == "i3"
-
-mouse_pointer = None
-if not wm == "sway":
-    try:
-        from pynput.mouse import Controller
-        mouse_pointer = Controller()
-    except:
-        pass
+# DesktopEntry objects by main category
+categories = Categories()
+all_entries = []
 
-# Lists to hold DesktopEntry objects of each category
-c_audio_video, c_development, c_game, c_graphics, c_network, c_office, c_science, c_settings, c_system, \
-c_utility, c_other, all_entries = [], [], [], [], [], [], [], [], [], [], [], []
-
-category_names = ['AudioVideo', 'Development', 'Game', 'Graphics', 'Network', 'Office', 'Science', 'Settings',
-                  'System', 'Utility', 'Other']
+category_names = CATEGORY_NAMES
 
 category_icons = {"AudioVideo": "applications-multimedia",
                   "Development": "applications-development",
@@ -77,87 +70,90 @@ locale = ''
 win = None  # overlay window
 args = None
 all_items_list = []  # list of all DesktopMenuItem objects assigned to a .desktop entry
-all_copies_list = []  # list of copies of above used while searching (not assigned to a submenu!)
+search_index = None  # SearchIndex of all_entries, built on the first search, ranked w/ clicks from the cache
+search_pool = []  # DesktopMenuItem objects (not assigned to a submenu!) reused to display search results
 menu_items_list = []  # created / updated with menu.get_children()
 filtered_items_list = []  # used in the search method
 
-# If we need to cheat_sway, we only add first args.t entries to all_copies list, but we need them all for searching!
-missing_copies_list = []
-
 config_dir = config_dirs()[0]
-if not os.path.exists(config_dir):
-    os.makedirs(config_dir)
 build_from_file = os.path.join(config_dirs()[0], 'appendix')
 
 if "XDG_CACHE_HOME" in os.environ:
     cache_dir = os.environ["XDG_CACHE_HOME"]
 else:
     cache_dir = os.path.join(os.path.expanduser('~/.cache'))
-if not os.path.exists(cache_dir):
-    os.makedirs(cache_dir)
 cache_file = os.path.join(cache_dir, 'sgtk-menu')
 
 cache = None
 sorted_cache = None
+pending_launches = []  # commands launched, but not yet recorded in the cache file
 
+handover_config = None  # see launcher.menu_config()
 
-def main():
-    # exit if already running, thanks to Slava V at https://stackoverflow.com/a/384493/4040598
-    pid_file = os.path.join(tempfile.gettempdir(), 'sgtk-menu.pid')
-    fp = open(pid_file, 'w')
-    try:
-        fcntl.lockf(fp, fcntl.LOCK_EX | fcntl.LOCK_NB)
-    except IOError:
-        subprocess.run("pkill -f sgtk-menu", shell=True)
-        sys.exit(2)
+# Resident (--daemon) instance only
+REFRESH_INTERVAL = 5  # seconds between checks for new or removed .desktop files, while the menu is hidden
+entries_state = None  # state of applications directories the menu has been built from
+daemon_socket = None
 
-    global build_from_file
-
-    if not sys.stdin.isatty():
-        global pipe_menu
-        pipe_menu = []
-        for line in sys.stdin:
-            pipe_menu.append(line.rstrip())
-    
-    parser = argparse.ArgumentParser(description="GTK menu for sway, i3 and some other WMs")
-    placement = parser.add_mutually_exclusive_group()
-    placement.add_argument("-b", "--bottom", action="store_true", help="display menu at the bottom")
-    placement.add_argument("-c", "--center", action="store_true", help="center menu on the screen")
-    placement.add_argument("-p", "--pointer", action="store_true", help="display at mouse pointer (not-sway only)")
-
-    favourites = parser.add_mutually_exclusive_group()
-    favourites.add_argument("-f", "--favourites", action="store_true", help="prepend 5 most used items")
-    favourites.add_argument('-fn', type=int, help="prepend <FN> most used items")
-
-    appendix = parser.add_mutually_exclusive_group()
-    appendix.add_argument("-a", "--append", action="store_true",
-                          help="append custom menu from {}".format(build_from_file))
-    appendix.add_argument("-af", type=str, help="append custom menu from {}".format(os.path.join(config_dir, '<AF>')))
-
-    parser.add_argument("-n", "--no-menu", action="store_true", help="skip menu, display appendix only")
-    parser.add_argument("-l", type=str, help="force language (e.g. \"de\" for German)")
-    parser.add_argument("-s", type=int, default=20, help="menu icon size (min: 16, max: 48, default: 20)")
-    parser.add_argument("-w", type=int, help="menu width in px (integer, default: screen width / 8)")
-    parser.add_argument("-d", type=int, default=100, help="menu delay in milliseconds (default: 100; sway & i3 only)")
-    parser.add_argument("-o", type=float, default=0.3,
-                        help="overlay opacity (min: 0.0, max: 1.0, default: 0.3; sway only)")
-    parser.add_argument("-t", type=int, default=30, help="sway submenu lines limit (default: 30)")
-    parser.add_argument("-y", type=int, default=0, help="y offset from edge to display menu at")
-    parser.add_argument("-css", type=str, default="style.css",
-                        help="use alternative {} style sheet instead of style.css"
-                        .format(os.path.join(config_dir, '<CSS>')))
-    parser.add_argument("-v", "--version", action="store_true", help="display version and exit")
-    parser.add_argument("-wm", action="store_true", help="display detected Window Manager and exit")
-    global args
-    args = parser.parse_args()
+
+def main(parsed_args, piped_lines=None, config=None):
+    """
+    See the launcher module
+    :param parsed_args: parsed command line arguments
+    :param piped_lines: lines piped to stdin, for the pipe menu; None if none
+    :param config: the arguments, as compared with those of the daemon (see launcher.menu_config)
+    """
+    timings.mark("imports")
+    global build_from_file, args, pipe_menu, handover_config
+    args = parsed_args
+    pipe_menu = piped_lines
+    handover_config = config
+
+    if args.icon_pool is not None:
+        set_pool_budget(args.icon_pool)
 
     if args.version:
         print_version()
         sys.exit(0)
+
+    global wm, other_wm, mouse_pointer
+    wm = check_wm()
+    timings.mark("wm")
     if args.wm:
         print(wm)
         sys.exit(0)
-        
+
+    # exit if already running, thanks to Slava V at https://stackoverflow.com/a/384493/4040598
+    pid_file = os.path.join(tempfile.gettempdir(), 'sgtk-menu-daemon.pid' if args.daemon else 'sgtk-menu.pid')
+    # Don't truncate before we hold the lock: the file tells which process to kill
+    fp = open(pid_file, 'a+')
+    try:
+        fcntl.lockf(fp, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except IOError:
+        if args.daemon:
+            print("sgtk-menu daemon already running")
+        else:
+            # Kill the instance holding the lock: the key binding toggles the menu. Not pkill: it'd kill the daemon.
+            fp.seek(0)
+            try:
+                os.kill(int(fp.read().strip()), signal.SIGTERM)
+            except (ValueError, OSError) as e:
+                print(e)
+        sys.exit(2)
+    fp.seek(0)
+    fp.truncate()
+    fp.write(str(os.getpid()))
+    fp.flush()
+
+    # This will apply to the overlay window, as setting the window type POPUP does not impress sway :)
+    install_window_rules(wm)
+    other_wm = not wm == "sway" and not wm == "i3"
+    mouse_pointer = mouse_controller(wm)
+    timings.mark("wm_setup")
+
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+
     if pipe_menu:
         args.no_menu = True
 
@@ -167,6 +163,7 @@ def main():
 
     # Create default config files if not found
     create_default_configs(config_dir)
+    timings.mark("configs")
 
     css_file = os.path.join(config_dirs()[0], args.css) if os.path.exists(
         os.path.join(config_dirs()[0], 'style.css')) else None
@@ -189,19 +186,18 @@ def main():
                 screen, provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
         except Exception as e:
             print(e)
+    timings.mark("css")
 
     # cache stores number of clicks on each item
     global cache
-    cache = load_json(cache_file)
-
-    if not cache:
-        save_json(cache, cache_file)
+    cache = load_counts(cache_file)
     global sorted_cache
     sorted_cache = sorted(cache.items(), reverse=True, key=lambda x: x[1])
+    timings.mark("cache")
 
     global locale
     locale = get_locale_string(args.l)
-    category_names_dictionary = localized_category_names(locale)
+    category_names_dictionary = localized_category_names(locale, cache_dir, category_names)
 
     # replace additional category names with main ones
     for name in category_names:
@@ -210,6 +206,7 @@ def main():
             localized_names_dictionary[main_category_name] = category_names_dictionary[main_category_name]
         except:
             pass
+    timings.mark("localized_category_names")
 
     screen = Gdk.Screen.get_default()
     provider = Gtk.CssProvider()
@@ -218,24 +215,51 @@ def main():
         screen, provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
     )
 
-    # find all .desktop entries, create DesktopEntry class instances;
-    # DesktopEntry adds itself to the proper List in the class constructor
+    # find all .desktop entries, create DesktopEntry class instances, and sort them into categories
     list_entries()
+    timings.mark("list_entries")
 
     # Overlay window
     global win
     win = MainWindow()
+    # in case `swaymsg reload` dropped the rules installed above
+    watch_window_rules(win, wm)
+    timings.mark("window")
+
+    if not place_window() and not args.daemon:
+        print("\nFailed to get the current screen geometry, exiting...\n")
+        sys.exit(2)
+    timings.mark("geometry")
+
+    setup_menu()
+    timings.mark("build_menu")
+    win.menu.connect("popped-up", timings.first_shown("popped-up"))
+
+    if args.daemon:
+        # Stay hidden until asked to show the menu
+        global entries_state, daemon_socket
+        entries_state = desktop_entries_state([os.path.join(p, 'applications') for p in data_dirs()])
+        daemon_socket = listen('sgtk-menu', on_command)
+        GLib.timeout_add_seconds(REFRESH_INTERVAL, refresh_when_hidden)
+        # Later pop-ups are not startups
+        timings.mark("listening")
+        timings.dump()
+    else:
+        win.show_all()
+        GLib.timeout_add(args.d, open_menu)
+    Gtk.main()
+
+    record_pending_launches()
+
 
-    geometry = (0, 0, 0, 0)
-    # If we're not on sway neither i3, this won't return values until the window actually shows up.
-    # Let's try as many times as needed. The retries int protects from an infinite loop.
-    retries = 0
-    while geometry[0] == 0 and geometry[1] == 0 and geometry[2] == 0 and geometry[3] == 0:
-        geometry = display_geometry(win, wm, mouse_pointer)
-        retries += 1
-        if retries > 50:
-            print("\nFailed to get the current screen geometry, exiting...\n")
-            sys.exit(2)
+def place_window():
+    """
+    Resizes and moves the overlay window, according to the geometry of currently focused display
+    :return: False if the geometry could not be obtained
+    """
+    geometry = wait_for_geometry(win, wm, mouse_pointer)
+    if not geometry:
+        return False
     x, y, w, h = geometry
 
     if wm == "sway":
@@ -257,7 +281,10 @@ def main():
             y = y + args.y
 
         win.move(x, y)
+    return True
+
 
+def setup_menu():
     win.menu = build_menu()
     win.menu.set_property("name", "menu")
 
@@ -271,10 +298,69 @@ def main():
         win.menu.set_property("width_request", args.w)
     else:
         win.menu.set_property("width_request", int(win.screen_dimensions[0] / 8))
-    win.show_all()
 
-    GLib.timeout_add(args.d, open_menu)
-    Gtk.main()
+
+def on_command(command):
+    """
+    Handles commands sent to the resident instance (see the daemon module)
+    :return: reply for the client
+    """
+    command, sep, config = command.partition(' ')
+    if command == "show":
+        if config and config != handover_config:
+            # The client has been started with other arguments, and will display its own menu
+            return "mismatch"
+        if win.menu.get_visible():
+            # Same as killing the non-resident instance: the key binding toggles the menu
+            win.menu.hide()
+        elif place_window():
+            if not args.w:
+                win.menu.set_property("width_request", int(win.screen_dimensions[0] / 8))
+            win.show_all()
+            GLib.timeout_add(args.d, open_menu)
+        return "ok"
+    elif command == "rebuild":
+        refresh_menu(force=True)
+    elif command == "quit":
+        Gtk.main_quit()
+
+
+def refresh_menu(force=False):
+    """
+    Rebuilds the menu of the resident instance, if .desktop entries or favourites changed since it was built.
+    Called when idle, after the menu has been hidden, and periodically while it's hidden (see refresh_when_hidden).
+    """
+    global entries_state, sorted_cache
+    paths = [os.path.join(p, 'applications') for p in data_dirs()]
+    state = desktop_entries_state(paths)
+
+    favs_number = 5 if args.favourites else args.fn or 0
+    new_sorted_cache = sorted(cache.items(), reverse=True, key=lambda x: x[1])
+    favs_changed = [i[0] for i in new_sorted_cache[:favs_number]] != [i[0] for i in sorted_cache[:favs_number]]
+    sorted_cache = new_sorted_cache
+
+    if force or favs_changed or state != entries_state:
+        entries_state = state
+        global search_index
+        search_index = None
+        categories.clear()
+        for entries in [all_entries, all_items_list]:
+            del entries[:]
+        list_entries()
+        old_menu = win.menu
+        setup_menu()
+        old_menu.destroy()
+    return False
+
+
+def refresh_when_hidden():
+    """
+    Rebuilds the menu in the background if applications have been installed or removed, so that it's up to date
+    by the time it's asked for
+    """
+    if not win.menu.get_visible():
+        refresh_menu()
+    return True
 
 
 class MainWindow(Gtk.Window):
@@ -361,40 +447,17 @@ class MainWindow(Gtk.Window):
 
             if update:
                 if len(self.search_phrase) > 0:
-                    filtered_items_list = []
-                    for item in all_copies_list:
-                        self.menu.remove(item)
-                        # We'll search the entry name and the first element of its command (to skip arguments)
-                        if self.search_phrase.upper() in item.name.upper() or self.search_phrase.upper() in \
-                                item.exec.split()[0].upper():
-                            # avoid adding twice
-                            found = False
-                            for i in filtered_items_list:
-                                if i.name == item.name:
-                                    found = True
-                                    break
-                            if not found:
-                                filtered_items_list.append(item)
-
-                    # If we needed to cheat_sway, the values missing from all_copies_list are now here
-                    if missing_copies_list:
-                        for item in missing_copies_list:
-                            self.menu.remove(item)
-                            # We'll search the entry name and the first element of its command (to skip arguments)
-                            if self.search_phrase.upper() in item.name.upper() or self.search_phrase.upper() in \
-                                    item.exec.split()[0].upper():
-                                # avoid adding twice
-                                found = False
-                                for i in filtered_items_list:
-                                    if i.name == item.name:
-                                        found = True
-                                        break
-                                if not found:
-                                    filtered_items_list.append(item)
+                    # We search DesktopEntry objects; menu items are only bound to those we're going to display
+                    global search_index
+                    if not search_index:
+                        search_index = SearchIndex(all_entries, counts=cache)
+                    found_entries = search_index.search(self.search_phrase, limit=args.t)
 
                     for item in self.menu.get_children()[1:]:
                         self.menu.remove(item)
 
+                    filtered_items_list = search_result_items(found_entries)
+
                     for item in filtered_items_list:
                         self.menu.append(item)
                         item.deselect()
@@ -434,11 +497,36 @@ class MainWindow(Gtk.Window):
         context.paint()
         context.set_operator(cairo.OPERATOR_OVER)
 
-    def die(self, *args):
-        Gtk.main_quit()
+    def reset_search(self):
+        """
+        Restores the original menu, so that the resident instance pops up clean next time
+        """
+        global filtered_items_list
+        if self.search_phrase:
+            self.search_phrase = ''
+            for item in self.menu.get_children():
+                self.menu.remove(item)
+            for item in menu_items_list:
+                self.menu.append(item)
+            self.search_item.set_sensitive(False)
+        self.search_box.set_text('Type to search')
+        filtered_items_list = []
+
+    def die(self, *_):
+        if args.daemon:
+            self.hide()
+            GLib.idle_add(self.after_hide)
+        else:
+            Gtk.main_quit()
+
+    def after_hide(self):
+        self.reset_search()
+        refresh_menu()
+        return False
 
 
 def open_menu():
+    timings.mark("open_menu")
     if args.bottom:
         gravity_widget = Gdk.Gravity.NORTH
         gravity_menu = Gdk.Gravity.SOUTH
@@ -454,117 +542,35 @@ def open_menu():
     if other_wm and not win.menu.get_visible():
         # In Openbox, if the MainWindow (which is invisible!) gets accidentally clicked and dragged,
         # the menu doesn't pop up, but the process is still alive. Let's kill the bastard, if so.
-        Gtk.main_quit()
+        win.die()
 
 
 def list_entries():
     paths = ([os.path.join(p, 'applications') for p in data_dirs()])
-    for path in paths:
-        if os.path.exists(path):
-            for f in os.listdir(path):
-                _name, _exec, _icon, _categories = '', '', '', ''
-                try:
-                    with open(os.path.join(path, f)) as d:
-                        lines = d.readlines()
-                        read_me = True
-                        for line in lines:
-                            if line.startswith("["):
-                                read_me = line.strip() == "[Desktop Entry]"
-                                continue
-                            if read_me:
-                                loc_name = 'Name{}='.format(locale)
-
-                                if line.startswith('Name='):
-                                    _name = line.split('=')[1].strip()
-                                    continue
-
-                                if line.startswith(loc_name):
-                                    _name = line.split('=')[1].strip()
-                                    continue
-
-                                if line.startswith('Exec='):
-                                    cmd = line.split('=')[1:]
-                                    c = '='.join(cmd)
-                                    _exec = c.strip()
-                                    if '%' in _exec:
-                                        _exec = _exec.split('%')[0].strip()
-                                    continue
-
-                                if line.startswith('Icon='):
-                                    _icon = line.split('=')[1].strip()
-                                    continue
-
-                                if line.startswith('Categories'):
-                                    _categories = line.split('=')[1].strip()
-                                    continue
-
-                        if not _icon:
-                            _icon = os.path.join(config_dir, 'icon-missing.svg')
-
-                        if _name and _exec:
-                            if not _categories:
-                                _categories = "Other;"
-                            # this will hold the data we need, and also automagically append itself to the proper list
-                            entry = DesktopEntry(_name, _exec, _icon, _categories)
-                            # we need this list for the favourites menu
-                            all_entries.append(entry)
-                except Exception as e:
-                    print(e)
-
-
-class DesktopEntry(object):
-    """
-    Should be self-explanatory
-    """
-
-    def __init__(self, name, exec, icon=None, categories=None):
-        self.name = name
-        self.exec = exec
-        self.icon = icon
-        if categories:
-            self.categories = categories.split(';')[:-1]
-
-        if self.categories:
-            for category in self.categories:
-                main_category = additional_to_main(category)
-                if main_category == 'AudioVideo' and self not in c_audio_video:
-                    c_audio_video.append(self)
-                elif main_category == 'Development' and self not in c_development:
-                    c_development.append(self)
-                elif main_category == 'Game' and self not in c_game:
-                    c_game.append(self)
-                elif main_category == 'Graphics' and self not in c_graphics:
-                    c_graphics.append(self)
-                elif main_category == 'Network' and self not in c_network:
-                    c_network.append(self)
-                elif main_category == 'Office' and self not in c_office:
-                    c_office.append(self)
-                elif (main_category == 'Science' or main_category == 'Education') and self not in c_science:
-                    c_science.append(self)
-                elif main_category == 'Settings' and self not in c_settings:
-                    c_settings.append(self)
-                elif main_category == 'System' and self not in c_system:
-                    c_system.append(self)
-                elif main_category == 'Utility' and self not in c_utility:
-                    c_utility.append(self)
-
-        if self not in c_audio_video and self not in c_development \
-                and self not in c_game and self not in c_graphics and self not in c_network \
-                and self not in c_office and self not in c_science and self not in c_settings \
-                and self not in c_system and self not in c_utility:
-            c_other.append(self)
-
-        for group in [c_audio_video, c_development, c_game, c_graphics, c_network, c_office, c_science, c_settings,
-                      c_system, c_utility]:
-            group.sort(key=lambda x: x.name)
+    for item in list_desktop_entries(paths, locale, cache_dir, workers=args.j):
+        _icon = item["icon"]
+        if not _icon:
+            _icon = os.path.join(config_dir, 'icon-missing.svg')
+
+        if item["name"] and item["exec"]:
+            _categories = item["categories"]
+            if not _categories:
+                _categories = "Other;"
+            entry = DesktopEntry(item["name"], item["exec"], _icon, _categories)
+            categories.add(entry)
+            # we need this list for the favourites menu
+            all_entries.append(entry)
+    categories.sort()
 
 
 def build_menu():
-    icon_theme = Gtk.IconTheme.get_default()
     menu = Gtk.Menu()
 
     if not args.no_menu:
         win.search_item = Gtk.MenuItem()
+        if win.search_box.get_parent():
+            # rebuilding the menu of the resident instance
+            win.search_box.get_parent().remove(win.search_box)
         win.search_item.add(win.search_box)
         win.search_item.set_sensitive(False)
         menu.add(win.search_item)
@@ -596,24 +602,7 @@ def build_menu():
                 hbox = Gtk.HBox()
                 label = Gtk.Label()
                 label.set_text(name)
-                if icon.startswith('/'):
-                    try:
-                        pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(icon, args.s, args.s)
-                        image = Gtk.Image.new_from_pixbuf(pixbuf)
-                    except:
-                        pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(os.path.join(config_dir, 'icon-missing.svg'),
-                                                                        args.s, args.s)
-                        image = Gtk.Image.new_from_pixbuf(pixbuf)
-                else:
-                    try:
-                        if icon.endswith('.svg') or icon.endswith('.png'):
-                            icon = entry.icon.split('.')[0]
-                        pixbuf = icon_theme.load_icon(icon, args.s, Gtk.IconLookupFlags.FORCE_SIZE)
-                        image = Gtk.Image.new_from_pixbuf(pixbuf)
-                    except:
-                        pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(os.path.join(config_dir, 'icon-missing.svg'),
-                                                                        args.s, args.s)
-                        image = Gtk.Image.new_from_pixbuf(pixbuf)
+                image = load_image(icon, args.s)
                 if image:
                     hbox.pack_start(image, False, False, 10)
                 if name:
@@ -630,28 +619,9 @@ def build_menu():
                 menu.append(separator)
 
         # actual system menu with submenus for each category
-        if c_audio_video:
-            append_submenu(c_audio_video, menu, 'AudioVideo')
-        if c_development:
-            append_submenu(c_development, menu, 'Development')
-        if c_game:
-            append_submenu(c_game, menu, 'Game')
-        if c_graphics:
-            append_submenu(c_graphics, menu, 'Graphics')
-        if c_network:
-            append_submenu(c_network, menu, 'Network')
-        if c_office:
-            append_submenu(c_office, menu, 'Office')
-        if c_science:
-            append_submenu(c_science, menu, 'Science')
-        if c_settings:
-            append_submenu(c_settings, menu, 'Settings')
-        if c_system:
-            append_submenu(c_system, menu, 'System')
-        if c_utility:
-            append_submenu(c_utility, menu, 'Utility')
-        if c_other:
-            append_submenu(c_other, menu, 'Other')
+        for name in category_names:
+            if categories[name]:
+                append_submenu(categories[name], menu, name)
 
     # user-defined menu from default or custom file (see args)
     if args.append or args.af or args.no_menu or pipe_menu:
@@ -684,24 +654,7 @@ def build_menu():
                 label = Gtk.Label()
                 label.set_text(name)
                 if icon:
-                    if icon.startswith('/'):
-                        try:
-                            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(icon, args.s, args.s)
-                            image = Gtk.Image.new_from_pixbuf(pixbuf)
-                        except:
-                            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(os.path.join(config_dir, 'icon-missing.svg'),
-                                                                            args.s, args.s)
-                            image = Gtk.Image.new_from_pixbuf(pixbuf)
-                    else:
-                        try:
-                            if icon.endswith('.svg') or icon.endswith('.png'):
-                                icon = entry.icon.split('.')[0]
-                            pixbuf = icon_theme.load_icon(icon, args.s, Gtk.IconLookupFlags.FORCE_SIZE)
-                            image = Gtk.Image.new_from_pixbuf(pixbuf)
-                        except:
-                            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(os.path.join(config_dir, 'icon-missing.svg'),
-                                                                            args.s, args.s)
-                            image = Gtk.Image.new_from_pixbuf(pixbuf)
+                    image = load_image(icon, args.s)
                 else:
                     image = None
                 if image:
@@ -740,15 +693,8 @@ class SubMenu(Gtk.Menu):
 
 
 def sub_menu(entries_list, name, localized_name):
-    icon_theme = Gtk.IconTheme.get_default()
     outer_hbox = Gtk.HBox()
-    try:
-        pixbuf = icon_theme.load_icon(category_icons[name], args.s, Gtk.IconLookupFlags.FORCE_SIZE)
-        image = Gtk.Image.new_from_pixbuf(pixbuf)
-    except:
-        pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(os.path.join(config_dir, 'icon-missing.svg'),
-                                                        args.s, args.s)
-        image = Gtk.Image.new_from_pixbuf(pixbuf)
+    image = load_image(category_icons.get(name), args.s)
     if image:
         outer_hbox.pack_start(image, False, False, 10)
     item = Gtk.MenuItem()
@@ -763,57 +709,60 @@ def sub_menu(entries_list, name, localized_name):
     submenu.entries_list = entries_list
 
     submenu.set_property("reserve_toggle_size", False)
+    # Items are only created when the submenu is about to open for the first time: most of the submenus never are.
+    submenu.populated = False
+    item.connect("select", populate_submenu, submenu)
+    submenu.connect("show", populate_submenu)
+
+    item.add(outer_hbox)
+    submenu.connect("key-release-event", win.search_items)
     # On sway 1.4, if popped-up menu length exceeds the screen height, no buttons to scroll appear,
     # and the mouse scroller does not work, too. We need a workaround!
-    if not wm == "sway" or len(entries_list) < args.t:  # -t stands for sway submenu lines limit
-        # We are not on sway or submenu is short enough
-        for entry in entries_list:
-            subitem = DesktopMenuItem(icon_theme, entry.name, entry.exec, entry.icon)
-            subitem.connect('activate', launch, entry.exec)
-            all_items_list.append(subitem)
-
-            subitem_copy = DesktopMenuItem(icon_theme, entry.name, entry.exec, entry.icon)
-            subitem_copy.connect('activate', launch, entry.exec)
-            subitem_copy.show()
-            all_copies_list.append(subitem_copy)
-
-            submenu.append(subitem)
-
-        item.add(outer_hbox)
-        submenu.connect("key-release-event", win.search_items)
-        item.set_submenu(submenu)
-    else:
-        # This will be tricky as hell. We only add args.t items here.
+    if wm == "sway" and len(entries_list) >= args.t:  # -t stands for sway submenu lines limit
+        # This will be tricky as hell. We only add args.t items on populating.
         # The rest must be added on menu popped-up (cheat_sway).
-        for i in range(args.t):
-            entry = entries_list[i]
-            subitem = DesktopMenuItem(icon_theme, entry.name, entry.exec, entry.icon)
-            subitem.connect('activate', launch, entry.exec)
-            all_items_list.append(subitem)
-
-            subitem_copy = DesktopMenuItem(icon_theme, entry.name, entry.exec, entry.icon)
-            subitem_copy.connect('activate', launch, entry.exec)
-            subitem_copy.show()
-            all_copies_list.append(subitem_copy)
-
-            submenu.append(subitem)
+        submenu.connect("popped-up", cheat_sway, submenu.entries_list)
+        submenu.connect("hide", cheat_sway_on_exit)
+    item.set_submenu(submenu)
 
-        # If we're cheating sway, entries above args.t will be missing from all_copies_list.
-        # Let's store them here for searching purposes.
-        for entry in entries_list[args.t:]:
-            subitem_copy = DesktopMenuItem(icon_theme, entry.name, entry.exec, entry.icon)
-            subitem_copy.connect('activate', launch, entry.exec)
-            subitem_copy.show()
-            missing_copies_list.append(subitem_copy)
+    return item
 
-        item.add(outer_hbox)
-        submenu.connect("key-release-event", win.search_items)
-        if wm == "sway":
-            submenu.connect("popped-up", cheat_sway, submenu.entries_list)
-            submenu.connect("hide", cheat_sway_on_exit)
-        item.set_submenu(submenu)
 
-    return item
+def populate_submenu(widget, submenu=None):
+    """
+    Creates DesktopMenuItem objects of the submenu on its first "select" (of the parent item) or "show" event
+    """
+    if submenu is None:
+        submenu = widget
+    if submenu.populated:
+        return
+    submenu.populated = True
+
+    entries_list = submenu.entries_list
+    if wm == "sway" and len(entries_list) >= args.t:
+        entries_list = entries_list[:args.t]
+    for entry in entries_list:
+        subitem = DesktopMenuItem(entry.name, entry.exec, entry.icon)
+        subitem.connect('activate', launch, entry.exec)
+        all_items_list.append(subitem)
+        submenu.append(subitem)
+    submenu.show_all()
+
+
+def search_result_items(entries):
+    """
+    Binds DesktopEntry objects to menu items from the search_pool. New items are only created if the pool is
+    smaller than the number of results.
+    :return: list of DesktopMenuItem
+    """
+    while len(search_pool) < len(entries):
+        item = DesktopMenuItem()
+        item.connect('activate', launch_item)
+        item.show_all()
+        search_pool.append(item)
+    for item, entry in zip(search_pool, entries):
+        item.bind(entry.name, entry.exec, entry.icon)
+    return search_pool[:len(entries)]
 
 
 def cheat_sway(menu, flipped_rect, final_rect, flipped_x, flipped_y, entries_list):
@@ -823,10 +772,9 @@ def cheat_sway(menu, flipped_rect, final_rect, flipped_x, flipped_y, entries_lis
     them on submenu exit event (cheat_sway_on_exit). But scrolling overflowed menus works on sway, hurray!
     """
     if len(menu.get_children()) < len(entries_list):
-        icon_theme = Gtk.IconTheme.get_default()
         for i in range(args.t, len(entries_list)):
             entry = entries_list[i]
-            subitem = DesktopMenuItem(icon_theme, entry.name, entry.exec, entry.icon)
+            subitem = DesktopMenuItem(entry.name, entry.exec, entry.icon)
             subitem.connect('activate', launch, entry.exec)
 
             found = False
@@ -837,18 +785,6 @@ def cheat_sway(menu, flipped_rect, final_rect, flipped_x, flipped_y, entries_lis
             if not found:
                 all_items_list.append(subitem)
 
-            subitem_copy = DesktopMenuItem(icon_theme, entry.name, entry.exec, entry.icon)
-            subitem_copy.connect('activate', launch, entry.exec)
-            subitem_copy.show()
-
-            found = False
-            for it in all_copies_list:
-                if it.name == subitem.name:
-                    found = True
-                    break
-            if not found:
-                all_copies_list.append(subitem_copy)
-
             menu.append(subitem)
     menu.show_all()
     menu.reposition()
@@ -864,53 +800,64 @@ class DesktopMenuItem(Gtk.MenuItem):
     We'll a Gtk.MenuItem here, w/ a hbox inside; the box contains an icon and a label.
     """
 
-    def __init__(self, icon_theme, name, _exec, icon_name=None):
+    def __init__(self, name='', _exec='', icon_name=None):
         Gtk.MenuItem.__init__(self)
-        self.name = name
         self.set_property("name", "item")
-        self.exec = _exec
+        self.name = None
+        self.exec = None
+        self.icon_name = None
         hbox = Gtk.HBox()
-        image = None
-        if icon_name:
-            if icon_name.startswith('/'):
-                try:
-                    pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(icon_name, args.s, args.s)
-                    image = Gtk.Image.new_from_pixbuf(pixbuf)
-                except:
-                    pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(os.path.join(config_dir, 'icon-missing.svg'),
-                                                                    args.s, args.s)
-                    image = Gtk.Image.new_from_pixbuf(pixbuf)
-            else:
-                try:
-                    if icon_name.endswith('.svg') or icon_name.endswith('.png'):
-                        icon_name = icon_name.split('.')[0]
-                    pixbuf = icon_theme.load_icon(icon_name, args.s, Gtk.IconLookupFlags.FORCE_SIZE)
-                    image = Gtk.Image.new_from_pixbuf(pixbuf)
-                except:
-                    pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(os.path.join(config_dir, 'icon-missing.svg'),
-                                                                    args.s, args.s)
-                    image = Gtk.Image.new_from_pixbuf(pixbuf)
-        self.icon = image
-        label = Gtk.Label()
-        label.set_text(self.name)
-        if image:
-            hbox.pack_start(image, False, False, 0)
-        hbox.pack_start(label, False, False, 4)
+        self.icon = Gtk.Image()
+        self.label = Gtk.Label()
+        hbox.pack_start(self.icon, False, False, 0)
+        hbox.pack_start(self.label, False, False, 4)
         self.add(hbox)
+        self.bind(name, _exec, icon_name)
+
+    def bind(self, name, _exec, icon_name=None):
+        """
+        (Re)assigns the item to a .desktop entry; this way we reuse items to display search results
+        """
+        self.name = name
+        self.exec = _exec
+        self.label.set_text(name)
+        if icon_name != self.icon_name:
+            self.icon_name = icon_name
+            if icon_name:
+                self.icon.set_from_pixbuf(load_pixbuf(icon_name, args.s))
+            else:
+                self.icon.clear()
+
+
+def launch_item(item):
+    launch(item, item.exec)
 
 
 def launch(item, command, no_cache=False):
+    # run the command first; bookkeeping waits until our window is gone
+    spawn(command)
+    win.hide()
     if not no_cache:
-        # save command and increased clicks counter to the cache file; we won't cache items from the user-defined menu
-        if command not in cache:
-            cache[command] = 1
-        else:
-            cache[command] += 1
-        save_json(cache, cache_file)
-    # run the command an quit
-    subprocess.Popen('exec {}'.format(command), shell=True)
-    Gtk.main_quit()
+        # we won't cache items from the user-defined menu
+        cache[command] = cache.get(command, 0) + 1
+        pending_launches.append(command)
+    if args.daemon:
+        # the resident instance just hides along with the menu
+        GLib.idle_add(record_pending_launches)
+    else:
+        Gtk.main_quit()
+
+
+def record_pending_launches():
+    """
+    Logs launched commands, to increase their clicks counters in the cache file
+    """
+    for command in pending_launches:
+        record_launch(cache_file, command)
+    del pending_launches[:]
+    return False
 
 
 if __name__ == "__main__":
-    main()
+    from sgtk_menu import launcher
+    launcher.main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Search shared by the launchers.
+
+Search keys are normalized once, when the index is built. A phrase matches an item if its characters appear
+in the item name or command in the same order (fuzzy subsequence match). Matches are ranked by how well they match,
+weighted by the number of clicks stored in the sgtk-menu cache file, and only the top results are selected.
+When the user extends the phrase, we only look at what the previous phrase had found, so that typing doesn't
+get slower with the number of entries.
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+import os
+import math
+import heapq
+from operator import attrgetter
+
+# Score of 1 click, in units of match_score; clicks count logarithmically
+CLICKS_WEIGHT = 10
+
+
+def command_key(command):
+    """
+    :return: normalized basename of the first element of the command (to skip the path and arguments)
+    """
+    words = command.split()
+    return os.path.basename(words[0]).upper() if words else ''
+
+
+def match_score(phrase, text):
+    """
+    :param phrase: normalized search phrase
+    :param text: normalized search key
+    :return: how well phrase matches text (the more the better), None if it does not match at all
+    """
+    position = text.find(phrase)
+    if position == 0:
+        return 100
+    if position > 0:
+        # beginning of a word is better than a random substring
+        return 80 if not text[position - 1].isalnum() else 60
+
+    # subsequence: the more scattered the characters, the lower the score
+    i, first = 0, -1
+    for j, char in enumerate(text):
+        if char == phrase[i]:
+            if first < 0:
+                first = j
+            i += 1
+            if i == len(phrase):
+                gaps = j - first + 1 - len(phrase)
+                return max(1, 40 - gaps)
+    return None
+
+
+class SearchIndex(object):
+    """
+    Items are any objects; name and command are functions to get search keys out of them.
+    By default we take .name and .exec attributes (DesktopEntry, AppBox...).
+    """
+
+    def __init__(self, items, name=attrgetter('name'), command=attrgetter('exec'), counts=None):
+        """
+        :param counts: dictionary: command => number of clicks (the sgtk-menu cache)
+        """
+        # [normalized name, normalized command, name, clicks score, item]
+        self.keys = []
+        for item in items:
+            item_name, item_command = name(item), command(item)
+            clicks = counts.get(item_command, 0) if counts else 0
+            self.keys.append((item_name.upper(), command_key(item_command), item_name,
+                              CLICKS_WEIGHT * math.log2(1 + clicks), item))
+        self.phrase = ''
+        self.matches = self.keys
+
+    def search(self, phrase, limit=None):
+        """
+        :param phrase: search phrase, as typed
+        :param limit: max number of results (top-k), None for all of them
+        :return: list of matching items, the best first; of items with the same name, we only return the best one
+        """
+        phrase = phrase.upper()
+        # Whatever the extended phrase finds, the shorter one had found too
+        candidates = self.matches if self.phrase and phrase.startswith(self.phrase) else self.keys
+
+        matches = []
+        best = {}  # name => (score, tie breaker, item)
+        for position, key in enumerate(candidates):
+            name_score = match_score(phrase, key[0])
+            command_score = match_score(phrase, key[1])
+            if name_score is None and command_score is None:
+                continue
+            matches.append(key)
+            score = max(name_score or 0, command_score or 0) + key[3]
+            # On equal scores, keep the index order
+            ranked = (score, -position, key[4])
+            if key[2] not in best or ranked[:2] > best[key[2]][:2]:
+                best[key[2]] = ranked
+        self.matches = matches
+        self.phrase = phrase
+
+        if limit is None:
+            ranked = sorted(best.values(), key=lambda x: x[:2], reverse=True)
+        else:
+            ranked = heapq.nlargest(limit, best.values(), key=lambda x: x[:2])
+        return [item for score, position, item in ranked]
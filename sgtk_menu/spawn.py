@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Starting applications.
+
+We exec the command directly (no /bin/sh in between) whenever it contains nothing but words and quotes,
+and detach it from our session, so that it survives the launcher and does not receive our signals.
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+import shlex
+import subprocess
+
+# Characters which need the shell to interpret them
+SHELL_CHARS = set('|&;<>()$`*?[]{}~#!\n')
+
+
+def command_argv(command):
+    """
+    :param command: command line, with field codes already expanded (see entries.expand_field_codes)
+    :return: argv list, or None if the command needs a shell
+    """
+    if any(char in SHELL_CHARS for char in command):
+        return None
+    try:
+        argv = shlex.split(command)
+    except ValueError:
+        return None
+    # VAR=value command
+    if not argv or '=' in argv[0]:
+        return None
+    return argv
+
+
+def spawn(command):
+    """
+    Starts the command in a new session, and returns immediately
+    :return: subprocess.Popen object, or None on failure
+    """
+    argv = command_argv(command)
+    try:
+        if argv:
+            return subprocess.Popen(argv, stdin=subprocess.DEVNULL, start_new_session=True)
+        return subprocess.Popen('exec {}'.format(command), shell=True, stdin=subprocess.DEVNULL,
+                                start_new_session=True)
+    except OSError as e:
+        print(e)
+        return None
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Startup phase timings, to see where the popup latency goes.
+
+Launchers mark the end of each startup phase; marks are cheap and always recorded. With --timings (or the SGTK_TIMINGS
+environment variable) set, they get written as a single JSON line once the window shows up (or at exit):
+to stderr, or appended to a file, so that the numbers can be tracked across upgrades.
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+import os
+import sys
+import time
+import json
+import atexit
+
+ENV_VAR = 'SGTK_TIMINGS'
+
+started = time.monotonic()  # as early as the launcher imports this module
+marks = []  # [phase, milliseconds since started]
+program = ''
+destination = None  # '-' for stderr, or path to a file; None if disabled
+dumped = False
+
+
+def mark(phase):
+    if not dumped:
+        marks.append([phase, round((time.monotonic() - started) * 1000, 3)])
+
+
+def enable(name, path=None):
+    """
+    :param name: program name, e.g. 'sgtk-menu'
+    :param path: value of the --timings argument: '-' for stderr, a file name, or None to check the environment
+    """
+    global program, destination
+    program = name
+    destination = path or os.getenv(ENV_VAR) or None
+    if destination == '1':
+        destination = '-'
+    if destination:
+        atexit.register(dump)
+
+
+def dump(*args):
+    """
+    Writes timings once (connect it to the first map / popped-up event); more marks after this are ignored
+    :return: False, so that it may be used as a GLib callback
+    """
+    global dumped
+    if dumped:
+        return False
+    dumped = True
+    if not destination:
+        return False
+    line = json.dumps({"program": program, "pid": os.getpid(), "timestamp": round(time.time(), 3),
+                       "phases": marks})
+    try:
+        if destination == '-':
+            sys.stderr.write(line + '\n')
+            sys.stderr.flush()
+        else:
+            with open(destination, 'a') as f:
+                f.write(line + '\n')
+    except OSError as e:
+        print(e)
+    return False
+
+
+def first_shown(phase):
+    """
+    :return: signal handler which marks the phase and dumps timings, the first time it's called
+    """
+    def handler(*args):
+        mark(phase)
+        return dump()
+    return handler
@@ -10,11 +10,12 @@ Copyright (C) 2017-2019 Johan Malm <jgm323@gmail.com>
 Copyright (C) 2020 Piotr Miller <nwg.piotr@gmail.com>
 """
 import os
-import subprocess
 import shutil
 import locale
 import json
-import pkg_resources
+import tempfile
+
+from sgtk_menu import ipc
 
 
 def check_wm():
@@ -52,29 +53,14 @@ def check_wm():
     except KeyError:
         pass
 
-    try:
-        if subprocess.run(
-                ['swaymsg', '-t', 'get_seats'], stdout=subprocess.DEVNULL).returncode == 0:
-            print("from swaymsg")
-            print(wm)
-            return "sway"
-    except:
-        pass
+    # Environment tells nothing: if there's an IPC socket to talk to, ask what's behind it.
+    # W/o $SWAYSOCK / $I3SOCK, `sway --get-socketpath`, then `i3 --get-socketpath` may still find one.
+    for hint in ["sway", "i3"]:
+        version = ipc.request(ipc.GET_VERSION, wm=hint)
+        if version:
+            return "sway" if version.get("variant") == "sway" else "i3"
 
-    try:
-        if subprocess.run(['i3-msg', '-t', 'get_outputs'], stdout=subprocess.DEVNULL).returncode == 0:
-            print("from i3-msg")
-            print(wm)
-            return "i3"
-    except:
-        pass
-    
-    if wm:
-        print(wm)
-        return wm
-    else:
-        print(wm)
-        return "other"
+    return "other"
 
 
 def display_geometry(win, wm, mouse_pointer):
@@ -83,21 +69,21 @@ def display_geometry(win, wm, mouse_pointer):
     :return: (x, y, width, height)
     """
     if wm == "sway":
-        string = subprocess.getoutput("swaymsg -t get_outputs")
-        outputs = json.loads(string)
-        for i in range(len(outputs)):
-            if outputs[i]["focused"]:
-                rect = outputs[i]["rect"]
+        outputs = ipc.request(ipc.GET_OUTPUTS, wm=wm) or []
+        for output in outputs:
+            if output.get("focused"):
+                rect = output["rect"]
                 return rect["x"], rect["y"], rect["width"], rect["height"]
+        return 0, 0, 0, 0
     elif wm == "i3":
-        # Unfortunately `i3-msg -t get_outputs` output does not have the "focused" key.
+        # Unfortunately i3 GET_OUTPUTS reply does not have the "focused" key.
         # Let's find the active workspace and its rectangle.
-        string = subprocess.getoutput("i3-msg -t get_workspaces")
-        workspaces = json.loads(string)
-        for i in range(len(workspaces)):
-            if workspaces[i]['focused']:
-                rect = workspaces[i]["rect"]
+        workspaces = ipc.request(ipc.GET_WORKSPACES, wm=wm) or []
+        for workspace in workspaces:
+            if workspace.get("focused"):
+                rect = workspace["rect"]
                 return rect["x"], rect["y"], rect["width"], rect["height"]
+        return 0, 0, 0, 0
     else:
         # For not sway nor i3. This rises deprecation warnings and won't work w/o `pynput` module.
         # If window just opened, screen.get_active_window() may return None, so we need to retry.
@@ -119,6 +105,53 @@ def display_geometry(win, wm, mouse_pointer):
             return 0, 0, 0, 0
 
 
+def wait_for_geometry(win, wm, mouse_pointer, timeout=2000):
+    """
+    Geometry of currently focused display, as soon as it's known. On sway and i3 we ask the WM, and if it does not
+    answer, GTK. GTK may not know monitors until the window gets realized; instead of polling, we run a nested
+    main loop, and look again on signals which may bring the answer, or give up after timeout.
+    :param timeout: in milliseconds
+    :return: (x, y, width, height), or None if it could not be obtained
+    """
+    geometry = display_geometry(win, wm, mouse_pointer)
+    if geometry == (0, 0, 0, 0) and wm in ["sway", "i3"]:
+        # A failed request drops the IPC connection, so this one reconnects
+        geometry = display_geometry(win, wm, mouse_pointer)
+    if geometry != (0, 0, 0, 0):
+        return geometry
+    if wm in ["sway", "i3"]:
+        # Still no answer from the WM: ask GTK, as on other WMs
+        wm = None
+
+    from gi.repository import GLib
+    loop = GLib.MainLoop()
+    result = []
+
+    def retry(*args):
+        geometry = display_geometry(win, wm, mouse_pointer)
+        if geometry != (0, 0, 0, 0):
+            result.append(geometry)
+            loop.quit()
+        return False
+
+    screen = win.get_screen()
+    handlers = [(win, win.connect("realize", retry)),
+                (win, win.connect("map-event", retry)),
+                (screen, screen.connect("monitors-changed", retry)),
+                (screen, screen.connect("size-changed", retry))]
+    timer = GLib.timeout_add(timeout, loop.quit)
+    if not win.get_realized():
+        win.realize()
+    if not result:
+        loop.run()
+    if result:
+        # we did not time out
+        GLib.source_remove(timer)
+    for obj, handler in handlers:
+        obj.disconnect(handler)
+    return result[0] if result else None
+
+
 def get_locale_string(forced_lang=None):
     if forced_lang:
         language = forced_lang.split("_")[0]
@@ -131,25 +164,71 @@ def get_locale_string(forced_lang=None):
         return None
 
 
-def localized_category_names(lang='en'):
+# Increase whenever the structure of the category names cache changes
+CATEGORY_NAMES_VERSION = 1
+
+
+def category_names_file(cache_dir):
+    return os.path.join(cache_dir, 'sgtk-menu-categories')
+
+
+def dir_mtimes(paths):
+    """
+    :return: dictionary: directory path => mtime, or None if it does not exist
+    """
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            mtimes[path] = None
+    return mtimes
+
+
+def localized_category_names(lang='en', cache_dir=None, names=None):
     """
+    Translations come from .directory files in desktop-directories. With cache_dir given, they're kept there
+    together with the mtimes of the directories they came from, and we only walk and read them again
+    when the locale, the names asked for or any of the directories change.
     :param lang: detected or forced locale
+    :param cache_dir: where to keep the translations; None not to cache them
+    :param names: category names we need; None for all the names found
     :return: dictionary: category name => translated category name
     """
+    roots = [os.path.join(d, "desktop-directories") for d in data_dirs()]
+    wanted = sorted(names) if names else None
+    if cache_dir:
+        cached = load_json(category_names_file(cache_dir)) if os.path.isfile(category_names_file(cache_dir)) else {}
+        dirs = cached.get("dirs")
+        if (cached.get("version") == CATEGORY_NAMES_VERSION and cached.get("locale") == lang
+                and cached.get("wanted") == wanted and isinstance(dirs, dict)
+                and dirs == dir_mtimes(roots + [d for d in dirs if d not in roots])):
+            return cached["names"]
+
     defined_names = {}
-    for d in data_dirs():
-        d = d + "/desktop-directories/"
+    mtimes = dir_mtimes(roots)
+    for d in roots:
         for (dir_path, dir_names, file_names) in os.walk(d):
+            mtimes.update(dir_mtimes([dir_path]))
             for filename in file_names:
                 name, localized_name = translate_name(os.path.join(dir_path, filename), lang)
                 if name and localized_name and name not in defined_names:
                     defined_names[name] = localized_name
-                    if additional_to_main(name) not in defined_names:
-                        defined_names[additional_to_main(name)] = localized_name
+                    main_name = additional_to_main(name)
+                    if main_name and main_name not in defined_names:
+                        defined_names[main_name] = localized_name
 
     if "Other" not in defined_names:
         defined_names["Other"] = "Other"
+    if wanted:
+        defined_names = {n: defined_names[n] for n in wanted if n in defined_names}
 
+    if cache_dir:
+        try:
+            save_json({"version": CATEGORY_NAMES_VERSION, "locale": lang, "wanted": wanted, "dirs": mtimes,
+                       "names": defined_names}, category_names_file(cache_dir), indent=None)
+        except Exception as e:
+            print(e)
     return defined_names
 
 
@@ -176,16 +255,17 @@ def translate_name(path, lang):
 
 
 def data_dirs():
-    paths = [os.path.expanduser('~/.local/share'), "/usr/share", "/usr/local/share"]
-    if "XDG_DATA_DIRS" in os.environ:
-        dirs = os.environ["XDG_DATA_DIRS"]
-        if dirs:
-            dirs = dirs.split(":")
-            for d in dirs:
-                while d.endswith("/"):
-                    d = d[:-1]
-                if d not in paths:
-                    paths.append(d)
+    """
+    :return: data directories in the order of precedence: $XDG_DATA_HOME, then $XDG_DATA_DIRS; we also look
+    in /usr/local/share and /usr/share, even if $XDG_DATA_DIRS does not include them
+    """
+    paths = [os.getenv("XDG_DATA_HOME") or os.path.expanduser('~/.local/share')]
+    dirs = os.getenv("XDG_DATA_DIRS") or ""
+    for d in dirs.split(":") + ["/usr/local/share", "/usr/share"]:
+        while d.endswith("/"):
+            d = d[:-1]
+        if d and d not in paths:
+            paths.append(d)
     return paths
 
 
@@ -210,76 +290,181 @@ def config_dirs():
     return paths
 
 
-def additional_to_main(category):
+def cache_home():
+    if "XDG_CACHE_HOME" in os.environ:
+        return os.environ["XDG_CACHE_HOME"]
+    return os.path.expanduser('~/.cache')
+
+
+def runtime_dir():
+    return os.getenv("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+
+
+# Make our windows floating and borderless; this also applies to the overlay window,
+# as setting the window type POPUP does not impress sway :)
+WINDOW_RULES = ['for_window [title="~sgtk*"] floating enable', 'for_window [title="~sgtk*"] border none']
+
+
+def sway_session_id():
     """
-    See https://specifications.freedesktop.org/menu-spec/latest/apas02.html
+    :return: string identifying the running sway instance: its IPC socket path, inode and ctime; None if no socket
     """
-    if category == 'AudioVideo' or category in ['Audio', 'Video', 'Midi', 'Mixer', 'Sequencer', 'Tuner', 'TV',
-                                                'AudioVideoEditing', 'Player', 'Recorder', 'DiscBurning', 'Music',
-                                                'Sound & Video']:
-        return 'AudioVideo'
-
-    elif category == 'Development' or category in ['Building', 'Debugger', 'IDE', 'GUIDesigner', 'Profiling',
-                                                   'RevisionControl', 'Translation', 'WebDevelopment', 'Programming']:
-        return 'Development'
-
-    elif category == 'Game' or category in ['ActionGame', 'AdventureGame', 'ArcadeGame', 'BoardGame', 'BlocksGame',
-                                            'CardGame', 'KidsGame', 'LogicGame', 'RolePlaying', 'Shooter', 'Simulation',
-                                            'SportsGame', 'StrategyGame', 'Emulator', 'Games']:
-        return 'Game'
-
-    elif category == 'Graphics' or category in ['2DGraphics', 'VectorGraphics', 'RasterGraphics', '3DGraphics',
-                                                'Scanning', 'OCR', 'Photography']:
-        return 'Graphics'
-
-    elif category == 'Network' or category in ['Dialup', 'InstantMessaging', 'Chat', 'IRCClient', 'Feed',
-                                               'FileTransfer', 'HamRadio', 'News', 'P2P', 'RemoteAccess', 'Telephony',
-                                               'VideoConference', 'WebBrowser', 'Internet', 'Internet and Network']:
-        return 'Network'
-
-    elif category == 'Office' or category in ['Calendar', 'ContactManagement', 'Database', 'Dictionary', 'Chart',
-                                              'Email', 'Finance', 'FlowChart', 'PDA', 'ProjectManagement',
-                                              'Presentation', 'Spreadsheet', 'WordProcessor', 'Publishing', 'Viewer']:
-        return 'Office'
-
-    elif category == 'Science' or category in ['ArtificialIntelligence', 'Astronomy', 'Biology', 'Chemistry', 'Economy',
-                                               'Electricity', 'Geography', 'Geology', 'Geoscience', 'History',
-                                               'Humanities', 'MedicalSoftware', 'Physics', 'Robotics',
-                                               'Science & Math', 'Spirituality', 'Art', 'Construction', 'Languages',
-                                               'ComputerScience', 'DataVisualization', 'ImageProcessing', 'Literature',
-                                               'Math', 'NumericalAnalysis', 'Sports', 'ParallelComputing', 'Education']:
-        return 'Science'
-
-    elif category == 'Settings' or category in ['Preferences', 'DesktopSettings', 'HardwareSettings', 'PackageManager',
-                                                'Security', 'Accessibility', 'Administration', 'Hardware',
-                                                'Look and Feel', 'Personal', 'Universal Access']:
-        return 'Settings'
-
-    elif category == 'System' or category in ['FileTools', 'FileManager', 'TerminalEmulator', 'Filesystem', 'Monitor',
-                                              'System Tools']:
-        return 'System'
-
-    elif category == 'Utility' or category in ['TextTools', 'TelephonyTools', 'Maps', 'Archiving', 'Compression',
-                                               'Calculator', 'Clock', 'TextEditor', 'Accessories']:
-        return 'Utility'
-
-    elif category == 'Other' or category in ['Programs']:
-        return 'Other'
+    path = ipc.socket_path("sway")
+    try:
+        st = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return "{} {} {}".format(path, st.st_ino, st.st_ctime_ns)
 
-    else:
+
+def install_window_rules(wm, force=False, con_id=None):
+    """
+    Sway keeps for_window rules until it exits, and adds a duplicate on each call. We only send them once per
+    compositor session, and leave a marker in $XDG_RUNTIME_DIR to tell later launches they're already there.
+    `swaymsg reload` drops the rules, though, and the marker can't tell: see check_window_rules().
+    :param force: send the rules even if the marker says they're there
+    :param con_id: id of an already mapped window of ours, to make floating and borderless, too
+    """
+    if wm != "sway":
+        return
+    session = sway_session_id()
+    if not session:
+        return
+    marker = os.path.join(runtime_dir(), 'sgtk-menu-rules-{}'.format(os.getuid()))
+    if not force:
+        try:
+            with open(marker) as f:
+                if f.read() == session:
+                    return
+        except OSError:
+            pass
+
+    commands = list(WINDOW_RULES)
+    if con_id is not None:
+        commands.append('[con_id={}] floating enable, border none'.format(con_id))
+    results = ipc.run_commands(*commands, wm=wm)
+    if results and all(result.get("success") for result in results):
+        try:
+            tmp = '{}.{}'.format(marker, os.getpid())
+            with open(tmp, 'w') as f:
+                f.write(session)
+            os.replace(tmp, marker)
+        except OSError as e:
+            print(e)
+
+
+def find_window(node, pid):
+    """
+    :param node: node of the sway tree (see GET_TREE)
+    :return: first window of the process found in the node and its descendants, or None
+    """
+    if node.get("pid") == pid:
+        return node
+    for child in node.get("nodes", []) + node.get("floating_nodes", []):
+        window = find_window(child, pid)
+        if window:
+            return window
+    return None
+
+
+def check_window_rules(wm):
+    """
+    Our window should have been made floating by the for_window rules. If it's not, they've been dropped
+    (e.g. by `swaymsg reload`) while the marker still matches the session: we send them again, and fix the window.
+    :return: False, so that it may be used as a GLib callback
+    """
+    if wm != "sway":
+        return False
+    tree = ipc.request(ipc.GET_TREE, wm=wm)
+    window = find_window(tree, os.getpid()) if isinstance(tree, dict) else None
+    if window and window.get("type") != "floating_con":
+        install_window_rules(wm, force=True, con_id=window.get("id"))
+    return False
+
+
+def watch_window_rules(win, wm, delay=250):
+    """
+    Calls check_window_rules() a moment after each time the window gets mapped, when sway has placed it
+    :param delay: in milliseconds
+    """
+    if wm != "sway":
+        return
+
+    from gi.repository import GLib
+
+    def on_map(*args):
+        GLib.timeout_add(delay, check_window_rules, wm)
+        return False
+
+    win.connect("map-event", on_map)
+
+
+def mouse_controller(wm):
+    """
+    :return: pynput mouse Controller, or None on sway (it does not work there) or if pynput is missing
+    """
+    if wm == "sway":
+        return None
+    try:
+        from pynput.mouse import Controller
+        return Controller()
+    except:
         return None
 
 
+# Main categories => additional ones, see https://specifications.freedesktop.org/menu-spec/latest/apas02.html
+ADDITIONAL_CATEGORIES = {
+    'AudioVideo': ['Audio', 'Video', 'Midi', 'Mixer', 'Sequencer', 'Tuner', 'TV', 'AudioVideoEditing', 'Player',
+                   'Recorder', 'DiscBurning', 'Music', 'Sound & Video'],
+    'Development': ['Building', 'Debugger', 'IDE', 'GUIDesigner', 'Profiling', 'RevisionControl', 'Translation',
+                    'WebDevelopment', 'Programming'],
+    'Game': ['ActionGame', 'AdventureGame', 'ArcadeGame', 'BoardGame', 'BlocksGame', 'CardGame', 'KidsGame',
+             'LogicGame', 'RolePlaying', 'Shooter', 'Simulation', 'SportsGame', 'StrategyGame', 'Emulator', 'Games'],
+    'Graphics': ['2DGraphics', 'VectorGraphics', 'RasterGraphics', '3DGraphics', 'Scanning', 'OCR', 'Photography'],
+    'Network': ['Dialup', 'InstantMessaging', 'Chat', 'IRCClient', 'Feed', 'FileTransfer', 'HamRadio', 'News', 'P2P',
+                'RemoteAccess', 'Telephony', 'VideoConference', 'WebBrowser', 'Internet', 'Internet and Network'],
+    'Office': ['Calendar', 'ContactManagement', 'Database', 'Dictionary', 'Chart', 'Email', 'Finance', 'FlowChart',
+               'PDA', 'ProjectManagement', 'Presentation', 'Spreadsheet', 'WordProcessor', 'Publishing', 'Viewer'],
+    'Science': ['ArtificialIntelligence', 'Astronomy', 'Biology', 'Chemistry', 'Economy', 'Electricity', 'Geography',
+                'Geology', 'Geoscience', 'History', 'Humanities', 'MedicalSoftware', 'Physics', 'Robotics',
+                'Science & Math', 'Spirituality', 'Art', 'Construction', 'Languages', 'ComputerScience',
+                'DataVisualization', 'ImageProcessing', 'Literature', 'Math', 'NumericalAnalysis', 'Sports',
+                'ParallelComputing', 'Education'],
+    'Settings': ['Preferences', 'DesktopSettings', 'HardwareSettings', 'PackageManager', 'Security', 'Accessibility',
+                 'Administration', 'Hardware', 'Look and Feel', 'Personal', 'Universal Access'],
+    'System': ['FileTools', 'FileManager', 'TerminalEmulator', 'Filesystem', 'Monitor', 'System Tools'],
+    'Utility': ['TextTools', 'TelephonyTools', 'Maps', 'Archiving', 'Compression', 'Calculator', 'Clock', 'TextEditor',
+                'Accessories'],
+    'Other': ['Programs'],
+}
+
+# Any category => main category
+MAIN_CATEGORIES = {category: main_category for main_category, categories in ADDITIONAL_CATEGORIES.items()
+                   for category in [main_category] + categories}
+
+
+def additional_to_main(category):
+    """
+    See https://specifications.freedesktop.org/menu-spec/latest/apas02.html
+    :return: main category, or None if unknown
+    """
+    return MAIN_CATEGORIES.get(category)
+
+
 def create_default_configs(config_dir):
     # Create default config files if not found
-    src_files = pkg_resources.resource_listdir('sgtk_menu', 'config')
-    for file_name in src_files:
-        dst_file = os.path.join(config_dir, file_name)
-        if not os.path.isfile(dst_file):
-            src_file = os.path.join('config', file_name)
-            # Use stream copy, in case of zip egg packaging.
-            fsrc = pkg_resources.resource_stream('sgtk_menu', src_file)
-            with open(dst_file, 'wb') as fdst:
+    os.makedirs(config_dir, exist_ok=True)
+    try:
+        # Python >= 3.9; works with zip packaging, too
+        from importlib.resources import files
+        src_dir = files('sgtk_menu').joinpath('config')
+    except ImportError:
+        from pathlib import Path
+        src_dir = Path(__file__).parent.joinpath('config')
+    for src_file in src_dir.iterdir():
+        dst_file = os.path.join(config_dir, src_file.name)
+        if src_file.is_file() and not os.path.isfile(dst_file):
+            with src_file.open('rb') as fsrc, open(dst_file, 'wb') as fdst:
                 shutil.copyfileobj(fsrc, fdst)
 
 
@@ -295,14 +480,25 @@ def load_json(path):
         return {}
 
 
-def save_json(src_dict, path):
-    with open(path, 'w') as f:
-        json.dump(src_dict, f, indent=2)
+def save_json(src_dict, path, indent=2):
+    # Write to a temporary file and rename it, so that no reader ever sees a half-written file
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(src_dict, f, indent=indent)
+    os.replace(tmp_path, path)
 
 
 def print_version():
     try:
-        version = pkg_resources.require('sgtk-menu')[0].version
+        try:
+            from importlib.metadata import version as package_version
+        except ImportError:
+            # Python < 3.8: pkg_resources is slow to import, so we only fall back to it here
+            import pkg_resources
+
+            def package_version(name):
+                return pkg_resources.require(name)[0].version
+        version = package_version('sgtk-menu')
     except Exception as e:
         version = 'unknown version ({})'.format(e)
     print('\nsgtk-menu {} Copyright (c) 2020 Piotr Miller & Contributors\n'.format(version))
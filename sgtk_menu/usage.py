@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Clicks counters, stored in the sgtk-menu cache file (JSON: command => number of clicks).
+
+A launch only appends a one-line record to the <cache file>.log. Once the log grows above COMPACT_SIZE, records
+get folded into the JSON file (compaction). Appending processes hold a shared lock on the log, and compaction
+an exclusive one, so that no record appended by sgtk-menu and sgtk-grid running at the same time gets lost.
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+import os
+import json
+import fcntl
+
+from sgtk_menu.tools import load_json, save_json
+
+# Log size in bytes that triggers compaction
+COMPACT_SIZE = 4096
+
+
+def log_file(cache_file):
+    return '{}.log'.format(cache_file)
+
+
+def parse_log(data):
+    """
+    :param data: log file content
+    :return: list of commands
+    """
+    commands = []
+    for line in data.splitlines():
+        try:
+            commands.append(json.loads(line))
+        except ValueError:
+            # record torn by a crash
+            pass
+    return commands
+
+
+def load_counts(cache_file):
+    """
+    :return: dictionary: command => number of clicks, including records not yet compacted
+    """
+    counts = load_json(cache_file) if os.path.isfile(cache_file) else {}
+    try:
+        with open(log_file(cache_file)) as f:
+            commands = parse_log(f.read())
+    except FileNotFoundError:
+        commands = []
+    for command in commands:
+        counts[command] = counts.get(command, 0) + 1
+    return counts
+
+
+def record_launch(cache_file, command):
+    """
+    Appends the launch record; a single O_APPEND write, which does not interleave with other processes' records
+    """
+    fd = os.open(log_file(cache_file), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        os.write(fd, '{}\n'.format(json.dumps(command)).encode())
+        size = os.fstat(fd).st_size
+    finally:
+        os.close(fd)
+    if size > COMPACT_SIZE:
+        compact(cache_file)
+
+
+def compact(cache_file):
+    """
+    Folds the log into the JSON file, and empties the log
+    """
+    fd = os.open(log_file(cache_file), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        with os.fdopen(os.dup(fd)) as f:
+            commands = parse_log(f.read())
+        if commands:
+            counts = load_json(cache_file) if os.path.isfile(cache_file) else {}
+            for command in commands:
+                counts[command] = counts.get(command, 0) + 1
+            save_json(counts, cache_file)
+            os.ftruncate(fd, 0)
+    except Exception as e:
+        print(e)
+    finally:
+        os.close(fd)
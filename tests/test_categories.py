@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Tests of sorting entries into main categories, and of the translations of category names.
+Run with: python3 -m unittest
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from sgtk_menu import tools
+from sgtk_menu.categories import DesktopEntry, Categories, CATEGORY_NAMES
+from sgtk_menu.tools import ADDITIONAL_CATEGORIES, additional_to_main, localized_category_names
+
+
+class TestCategories(unittest.TestCase):
+    def bucketed(self, *entries):
+        categories = Categories()
+        for entry in entries:
+            categories.add(entry)
+        categories.sort()
+        return {name: [entry.name for entry in categories[name]] for name in CATEGORY_NAMES if categories[name]}
+
+    def test_desktop_entry(self):
+        self.assertEqual(DesktopEntry('Vim', 'vim', categories='Utility;TextEditor;').categories,
+                         ['Utility', 'TextEditor'])
+        self.assertEqual(DesktopEntry('Vim', 'vim').categories, [])
+
+    def test_main_and_additional(self):
+        self.assertEqual(self.bucketed(DesktopEntry('Vim', 'vim', categories='TextEditor;'),
+                                       DesktopEntry('Gimp', 'gimp', categories='Graphics;2DGraphics;RasterGraphics;')),
+                         {'Graphics': ['Gimp'], 'Utility': ['Vim']})
+
+    def test_several_main_categories(self):
+        self.assertEqual(self.bucketed(DesktopEntry('Steam', 'steam', categories='Network;FileTransfer;Game;')),
+                         {'Game': ['Steam'], 'Network': ['Steam']})
+
+    def test_other(self):
+        self.assertEqual(self.bucketed(DesktopEntry('A', 'a', categories='Unknown;'),
+                                       DesktopEntry('B', 'b', categories='Programs;'),
+                                       DesktopEntry('C', 'c', categories='Other;'),
+                                       DesktopEntry('D', 'd', categories='Programs;Office;')),
+                         {'Office': ['D'], 'Other': ['A', 'B', 'C']})
+
+    def test_sorted_and_cleared(self):
+        categories = Categories()
+        for name in ['Zathura', 'Atril', 'Evince']:
+            categories.add(DesktopEntry(name, name.lower(), categories='Office;Viewer;'))
+        categories.sort()
+        self.assertEqual([entry.name for entry in categories['Office']], ['Atril', 'Evince', 'Zathura'])
+        categories.clear()
+        self.assertEqual(categories['Office'], [])
+
+    def test_map(self):
+        for main_category, additional in ADDITIONAL_CATEGORIES.items():
+            self.assertEqual(additional_to_main(main_category), main_category)
+            for category in additional:
+                self.assertEqual(additional_to_main(category), main_category)
+        self.assertIsNone(additional_to_main('Unknown'))
+
+
+class TestLocalizedNames(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, 'cache')
+        os.makedirs(self.cache_dir)
+        self.data_home = os.path.join(self.tmp_dir.name, 'home')
+        self.data_dir = os.path.join(self.tmp_dir.name, 'system')
+        self.environ = mock.patch.dict(os.environ, {"XDG_DATA_HOME": self.data_home, "XDG_DATA_DIRS": self.data_dir})
+        self.environ.start()
+        self.directory(self.data_dir, 'game.directory', 'Game', 'Spiele')
+        self.directory(self.data_dir, 'office.directory', 'Office', 'Büro')
+
+    def tearDown(self):
+        self.environ.stop()
+        self.tmp_dir.cleanup()
+
+    def directory(self, data_dir, file_name, name, localized_name):
+        path = os.path.join(data_dir, 'desktop-directories')
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, file_name), 'w') as f:
+            f.write('[Desktop Entry]\nName={}\nName[de]={}\n'.format(name, localized_name))
+        # mtime granularity: make sure the directory looks modified
+        mtime = os.stat(path).st_mtime_ns + 10 ** 9
+        os.utime(path, ns=(mtime, mtime))
+
+    def translated(self, lang='[de]', names=CATEGORY_NAMES):
+        """
+        :return: translations, and whether any .directory file was read
+        """
+        with mock.patch.object(tools, 'translate_name', wraps=tools.translate_name) as translate_name:
+            result = localized_category_names(lang, self.cache_dir, names)
+        return result, translate_name.called
+
+    def test_uncached(self):
+        self.assertEqual(localized_category_names('[de]'),
+                         {'Game': 'Spiele', 'Office': 'Büro', 'Other': 'Other'})
+
+    def test_warm_start_reads_nothing(self):
+        expected = {'Game': 'Spiele', 'Office': 'Büro', 'Other': 'Other'}
+        self.assertEqual(self.translated(), (expected, True))
+        self.assertEqual(self.translated(), (expected, False))
+
+    def test_new_file(self):
+        self.translated()
+        self.directory(self.data_dir, 'science.directory', 'Science', 'Wissenschaft')
+        self.assertEqual(self.translated(), ({'Game': 'Spiele', 'Office': 'Büro', 'Other': 'Other',
+                                              'Science': 'Wissenschaft'}, True))
+
+    def test_new_data_dir(self):
+        self.translated()
+        # higher precedence, and did not exist before
+        self.directory(self.data_home, 'games.directory', 'Game', 'Spielchen')
+        self.assertEqual(self.translated()[0]['Game'], 'Spielchen')
+
+    def test_locale_and_names(self):
+        self.translated()
+        self.assertEqual(self.translated('[en]'), ({'Game': 'Game', 'Office': 'Office', 'Other': 'Other'}, True))
+        self.assertEqual(self.translated('[en]', ['Game']), ({'Game': 'Game'}, True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Tests of the $PATH commands index of sgtk-dmenu.
+Run with: python3 -m unittest
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from sgtk_menu import commands
+
+
+class TestCommands(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, 'cache')
+        os.makedirs(self.cache_dir)
+        self.bin = self.directory('bin')
+        self.local_bin = self.directory('local-bin')
+        self.environ = mock.patch.dict(os.environ, {"PATH": '{}:{}/'.format(self.local_bin, self.bin)})
+        self.environ.start()
+
+    def tearDown(self):
+        self.environ.stop()
+        self.tmp_dir.cleanup()
+
+    def directory(self, name):
+        path = os.path.join(self.tmp_dir.name, name)
+        os.makedirs(path)
+        return path
+
+    def program(self, directory, name, mode=0o755):
+        path = os.path.join(directory, name)
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\n')
+        os.chmod(path, mode)
+        return path
+
+    def listed(self):
+        """
+        :return: commands, and directories listed (not taken from the index)
+        """
+        with mock.patch.object(commands, 'list_executables', wraps=commands.list_executables) as list_executables:
+            result = commands.list_commands(self.cache_dir)
+        return result, sorted(os.path.basename(call[0][0]) for call in list_executables.call_args_list)
+
+    def test_executables_only(self):
+        self.program(self.bin, 'zsh')
+        self.program(self.bin, 'notes.txt', mode=0o644)
+        self.program(self.bin, '.hidden')
+        os.makedirs(os.path.join(self.bin, 'subdir'))
+        os.symlink(self.program(self.tmp_dir.name, 'real'), os.path.join(self.bin, 'link'))
+        os.symlink(os.path.join(self.tmp_dir.name, 'missing'), os.path.join(self.bin, 'broken'))
+        self.assertEqual(commands.list_commands(self.cache_dir), ['link', 'zsh'])
+
+    def test_same_name_listed_once(self):
+        self.program(self.bin, 'vim')
+        self.program(self.local_bin, 'vim')
+        self.program(self.bin, 'awk')
+        self.program(self.local_bin, 'zathura')
+        self.assertEqual(commands.list_commands(self.cache_dir), ['awk', 'vim', 'zathura'])
+
+    def test_warm_start_lists_nothing(self):
+        self.program(self.bin, 'vim')
+        self.assertEqual(self.listed(), (['vim'], ['bin', 'local-bin']))
+        self.assertEqual(self.listed(), (['vim'], []))
+
+    def test_changed_directory_listed(self):
+        self.program(self.bin, 'vim')
+        self.listed()
+        self.program(self.local_bin, 'nvim')
+        # mtime granularity: make sure the directory looks modified
+        mtime = os.stat(self.local_bin).st_mtime_ns + 10 ** 9
+        os.utime(self.local_bin, ns=(mtime, mtime))
+        self.assertEqual(self.listed(), (['nvim', 'vim'], ['local-bin']))
+
+    def test_path_change(self):
+        self.program(self.bin, 'vim')
+        self.program(self.local_bin, 'nvim')
+        self.listed()
+        os.environ["PATH"] = self.bin
+        self.assertEqual(self.listed(), (['vim'], []))
+
+    def test_missing_directory(self):
+        os.environ["PATH"] = '{}:{}'.format(os.path.join(self.tmp_dir.name, 'missing'), self.bin)
+        self.program(self.bin, 'vim')
+        self.assertEqual(commands.list_commands(self.cache_dir), ['vim'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Tests of .desktop file scanning, and of the persistent index, on a temporary XDG tree.
+Run with: python3 -m unittest
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from sgtk_menu import entries
+from sgtk_menu.tools import data_dirs
+
+
+class EntriesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, 'cache')
+        os.makedirs(self.cache_dir)
+        # in the order of precedence, like data_dirs()
+        self.home = self.applications('home')
+        self.system = self.applications('system')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def applications(self, name):
+        path = os.path.join(self.tmp_dir.name, name, 'applications')
+        os.makedirs(path)
+        return path
+
+    def write(self, path, name, exec_='app', extra='', mtime=None):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write('[Desktop Entry]\nType=Application\nName={}\nName[de]={} (de)\nExec={}\n{}\n'.format(
+                name, name, exec_, extra))
+        if mtime:
+            os.utime(path, ns=(mtime, mtime))
+
+    def names(self, locale='[en]'):
+        return sorted(entry["name"] for entry in entries.list_desktop_entries([self.home, self.system], locale,
+                                                                             self.cache_dir))
+
+    def parsed(self, locale='[en]'):
+        """
+        :return: names of entries, and list of files parsed (not taken from the index)
+        """
+        with mock.patch.object(entries, 'parse_desktop_file', wraps=entries.parse_desktop_file) as parse:
+            names = self.names(locale)
+        return names, sorted(os.path.basename(call[0][0]) for call in parse.call_args_list)
+
+
+class TestIndex(EntriesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write(os.path.join(self.system, 'a.desktop'), 'A')
+        self.write(os.path.join(self.system, 'b.desktop'), 'B')
+
+    def test_warm_start_parses_nothing(self):
+        self.assertEqual(self.parsed(), (['A', 'B'], ['a.desktop', 'b.desktop']))
+        self.assertEqual(self.parsed(), (['A', 'B'], []))
+
+    def test_in_place_edit(self):
+        self.parsed()
+        # same directory listing, new content
+        path = os.path.join(self.system, 'a.desktop')
+        self.write(path, 'A2', mtime=os.stat(path).st_mtime_ns + 10 ** 9)
+        self.assertEqual(self.parsed(), (['A2', 'B'], ['a.desktop']))
+        self.assertEqual(self.parsed(), (['A2', 'B'], []))
+
+    def test_added_and_removed(self):
+        self.parsed()
+        os.remove(os.path.join(self.system, 'b.desktop'))
+        self.write(os.path.join(self.system, 'c.desktop'), 'C')
+        self.assertEqual(self.parsed(), (['A', 'C'], ['c.desktop']))
+
+    def test_locale_change(self):
+        self.parsed()
+        self.assertEqual(self.parsed('[de]'), (['A (de)', 'B (de)'], ['a.desktop', 'b.desktop']))
+
+    def test_stale_index_version(self):
+        self.parsed()
+        with mock.patch.object(entries, 'INDEX_VERSION', entries.INDEX_VERSION + 1):
+            self.assertEqual(self.parsed(), (['A', 'B'], ['a.desktop', 'b.desktop']))
+
+    def test_corrupt_index(self):
+        self.parsed()
+        with open(entries.index_file(self.cache_dir), 'w') as f:
+            f.write('{"version": ')
+        with mock.patch('builtins.print'):
+            self.assertEqual(self.parsed(), (['A', 'B'], ['a.desktop', 'b.desktop']))
+
+    def test_parallel_parsing(self):
+        for i in range(entries.PARALLEL_MIN_FILES):
+            self.write(os.path.join(self.system, 'app-{}.desktop'.format(i)), 'App {:02d}'.format(i))
+        expected = self.names()
+        os.remove(entries.index_file(self.cache_dir))
+        self.assertEqual(sorted(entry["name"] for entry in entries.list_desktop_entries(
+            [self.home, self.system], '[en]', self.cache_dir, workers=4)), expected)
+
+
+class TestDesktopIDs(EntriesTestCase):
+    def test_user_copy_shadows_system_one(self):
+        self.write(os.path.join(self.system, 'editor.desktop'), 'System Editor')
+        self.write(os.path.join(self.home, 'editor.desktop'), 'My Editor')
+        self.assertEqual(self.parsed(), (['My Editor'], ['editor.desktop']))
+
+    def test_subdirectory_ids(self):
+        self.write(os.path.join(self.system, 'kde4', 'foo.desktop'), 'System Foo')
+        # kde4/foo.desktop and kde4-foo.desktop are the same desktop file ID
+        self.write(os.path.join(self.home, 'kde4-foo.desktop'), 'My Foo')
+        self.write(os.path.join(self.system, 'kde4', 'bar.desktop'), 'Bar')
+        self.assertEqual(self.parsed(), (['Bar', 'My Foo'], ['bar.desktop', 'kde4-foo.desktop']))
+
+    def test_only_desktop_files(self):
+        self.write(os.path.join(self.system, 'a.desktop'), 'A')
+        self.write(os.path.join(self.system, 'README'), 'Readme')
+        self.write(os.path.join(self.system, 'mimeinfo.cache'), 'Cache')
+        self.assertEqual(self.parsed(), (['A'], ['a.desktop']))
+
+    def test_hidden_deletes_entry(self):
+        self.write(os.path.join(self.system, 'a.desktop'), 'A')
+        self.write(os.path.join(self.home, 'a.desktop'), 'A', extra='Hidden=true')
+        self.write(os.path.join(self.system, 'b.desktop'), 'B', extra='Hidden=false')
+        self.assertEqual(self.names(), ['B'])
+
+    def test_no_display(self):
+        self.write(os.path.join(self.system, 'a.desktop'), 'A', extra='NoDisplay=true')
+        self.write(os.path.join(self.system, 'b.desktop'), 'B')
+        self.assertEqual(self.names(), ['B'])
+
+    def test_try_exec(self):
+        executable = os.path.join(self.tmp_dir.name, 'installed')
+        with open(executable, 'w') as f:
+            f.write('#!/bin/sh\n')
+        os.chmod(executable, 0o755)
+        self.write(os.path.join(self.system, 'a.desktop'), 'A', extra='TryExec={}'.format(executable))
+        self.write(os.path.join(self.system, 'b.desktop'), 'B', extra='TryExec=/nonexistent/program')
+        self.write(os.path.join(self.system, 'c.desktop'), 'C', extra='TryExec=sgtk-no-such-program')
+        with mock.patch.dict(os.environ, {"PATH": self.tmp_dir.name}):
+            self.write(os.path.join(self.system, 'd.desktop'), 'D', extra='TryExec=installed')
+            self.assertEqual(self.names(), ['A', 'D'])
+            # checked on every run, not cached: the program may get uninstalled
+            os.remove(executable)
+            self.assertEqual(self.names(), [])
+
+    def test_symlink_loop(self):
+        self.write(os.path.join(self.system, 'a.desktop'), 'A')
+        os.makedirs(os.path.join(self.system, 'sub'))
+        os.symlink('.', os.path.join(self.system, 'loop'))
+        os.symlink('..', os.path.join(self.system, 'sub', 'up'))
+        self.assertEqual(self.parsed(), (['A'], ['a.desktop']))
+        self.assertEqual(self.parsed(), (['A'], []))
+
+    def test_symlink_into_other_tree(self):
+        # a vendor directory linked from home does not hide the system tree's own IDs
+        self.write(os.path.join(self.system, 'a.desktop'), 'A')
+        os.symlink(self.system, os.path.join(self.home, 'vendor'))
+        self.assertEqual(self.parsed(), (['A', 'A'], ['a.desktop', 'a.desktop']))
+
+    def test_new_file_in_subdirectory(self):
+        self.write(os.path.join(self.system, 'kde4', 'foo.desktop'), 'Foo')
+        self.parsed()
+        self.write(os.path.join(self.system, 'kde4', 'bar.desktop'), 'Bar')
+        self.assertEqual(self.parsed(), (['Bar', 'Foo'], ['bar.desktop']))
+
+    def test_data_dirs_order(self):
+        with mock.patch.dict(os.environ, {"XDG_DATA_HOME": "/home/user/.local/share",
+                                          "XDG_DATA_DIRS": "/opt/share/:/usr/share"}):
+            self.assertEqual(data_dirs(),
+                             ["/home/user/.local/share", "/opt/share", "/usr/share", "/usr/local/share"])
+
+
+class TestFieldCodes(unittest.TestCase):
+    def expand(self, command, name='Foo Bar', icon='foo', path='/usr/share/applications/foo.desktop'):
+        return entries.expand_field_codes(command, name, icon, path)
+
+    def test_file_codes_dropped(self):
+        self.assertEqual(self.expand('foo %U'), 'foo')
+        self.assertEqual(self.expand('foo %f --new-window'), 'foo --new-window')
+        # a quoted code is still a whole argument: no empty one left behind
+        self.assertEqual(self.expand('foo "%f"'), 'foo')
+
+    def test_codes_within_arguments(self):
+        self.assertEqual(self.expand('foo --file=%f'), 'foo --file=')
+        self.assertEqual(self.expand('foo --title=%c'), "foo '--title=Foo Bar'")
+        # already within quotes: quoted once, as a whole
+        self.assertEqual(self.expand('foo "--title=%c"'), "foo '--title=Foo Bar'")
+        self.assertEqual(self.expand('foo %c', name="Bob's"), 'foo \'Bob\'"\'"\'s\'')
+
+    def test_icon_and_path(self):
+        self.assertEqual(self.expand('foo %i %k'), 'foo --icon foo /usr/share/applications/foo.desktop')
+        self.assertEqual(self.expand('foo %i', icon=''), 'foo')
+
+    def test_quoting_kept(self):
+        self.assertEqual(self.expand('sh -c "echo 100%% | foo"'), "sh -c 'echo 100% | foo'")
+        self.assertEqual(self.expand('"/opt/My App/foo" %F'), "'/opt/My App/foo'")
+
+
+if __name__ == '__main__':
+    unittest.main()
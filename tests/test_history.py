@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Tests of the frecency history of sgtk-dmenu.
+Run with: python3 -m unittest
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from sgtk_menu import history
+from sgtk_menu.history import HALF_LIFE
+
+NOW = 1600000000
+
+
+class TestHistory(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = history.history_file(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_decay(self):
+        self.assertEqual(history.decayed([4, NOW], NOW), 4)
+        self.assertAlmostEqual(history.decayed([4, NOW], NOW + HALF_LIFE), 2)
+        self.assertAlmostEqual(history.decayed([4, NOW], NOW + 2 * HALF_LIFE), 1)
+        # a clock going back does not make scores grow
+        self.assertEqual(history.decayed([4, NOW], NOW - HALF_LIFE), 4)
+
+    def test_runs_add_up(self):
+        history.record_runs(self.path, ['vim', 'vim', 'htop'], NOW)
+        history.record_runs(self.path, ['vim'], NOW)
+        self.assertEqual(history.frecency(self.path, NOW), {'vim': 3, 'htop': 1})
+
+    def test_recent_beats_old_frequent(self):
+        history.record_runs(self.path, ['gimp'] * 4, NOW)
+        history.record_runs(self.path, ['foot'], NOW + 3 * HALF_LIFE)
+        scores = history.frecency(self.path, NOW + 3 * HALF_LIFE)
+        self.assertAlmostEqual(scores['gimp'], 0.5, places=3)
+        self.assertGreater(scores['foot'], scores['gimp'])
+
+    def test_max_entries(self):
+        with mock.patch.object(history, 'MAX_ENTRIES', 3):
+            history.record_runs(self.path, ['a', 'a', 'a', 'b', 'b', 'c', 'c', 'c', 'c'], NOW)
+            history.record_runs(self.path, ['d'], NOW)
+        # the lowest score goes, whatever the order of runs
+        self.assertEqual(set(history.frecency(self.path, NOW)), {'a', 'b', 'c'})
+        with mock.patch.object(history, 'MAX_ENTRIES', 3):
+            history.record_runs(self.path, ['d', 'd', 'd'], NOW)
+        self.assertEqual(set(history.frecency(self.path, NOW)), {'a', 'c', 'd'})
+
+    def test_missing_and_corrupt_files(self):
+        self.assertEqual(history.frecency(self.path, NOW), {})
+        with open(self.path, 'w') as f:
+            f.write('["not", "a", "dictionary"]')
+        self.assertEqual(history.frecency(self.path, NOW), {})
+        with open(self.path, 'w') as f:
+            f.write('{"vim": "broken", "htop": [1, %d]}' % NOW)
+        self.assertEqual(history.frecency(self.path, NOW), {'htop': 1})
+        with open(self.path, 'w') as f:
+            f.write('{"vim": ')
+        with mock.patch('builtins.print'):
+            self.assertEqual(history.frecency(self.path, NOW), {})
+            history.record_runs(self.path, ['vim'], NOW)
+        self.assertEqual(history.frecency(self.path, NOW), {'vim': 1})
+        self.assertEqual(os.listdir(self.tmp_dir.name), ['sgtk-dmenu-history'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Tests of the on-disk icon cache. Skipped if PyGObject is not installed.
+Run with: python3 -m unittest
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+import os
+import tempfile
+import unittest
+
+try:
+    from sgtk_menu import icons
+except ImportError:
+    icons = None
+
+
+@unittest.skipIf(icons is None, "PyGObject not installed")
+class TestIconCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = self.tmp_dir.name
+        for name in ['Papirus-1', 'Papirus-2', 'Papirus-Dark-1', 'Adwaita-1']:
+            os.makedirs(os.path.join(self.root, name))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_only_previous_states_removed(self):
+        icons.remove_stale(os.path.join(self.root, 'Papirus-3'))
+        self.assertEqual(sorted(os.listdir(self.root)), ['Adwaita-1', 'Papirus-Dark-1'])
+
+    def test_written_into_new_state(self):
+        pixbuf = icons.GdkPixbuf.Pixbuf.new(icons.GdkPixbuf.Colorspace.RGB, True, 8, 16, 16)
+        pixbuf.fill(0xff0000ff)
+        path = os.path.join(self.root, 'Papirus-Dark-2', 'foo')
+        icons.write_cached(path, pixbuf)
+        self.assertEqual(sorted(os.listdir(self.root)), ['Adwaita-1', 'Papirus-1', 'Papirus-2', 'Papirus-Dark-2'])
+        self.assertEqual(icons.read_cached(path).get_pixels(), pixbuf.get_pixels())
+
+
+if __name__ == '__main__':
+    unittest.main()
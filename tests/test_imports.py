@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Import time of the modules against the budget of `python3 -m sgtk_menu.bench import`, and no side effects on import.
+Launchers which need GTK are skipped if PyGObject is not installed.
+Run with: python3 -m unittest
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+from sgtk_menu.bench import import_times, IMPORT_BUDGET
+
+try:
+    import gi
+except ImportError:
+    gi = None
+
+# Modules which import GTK
+GTK_MODULES = ['sgtk_menu.menu', 'sgtk_menu.grid', 'sgtk_menu.dmenu', 'sgtk_menu.bar', 'sgtk_menu.icons']
+MODULES = ['sgtk_menu.launcher', 'sgtk_menu.tools', 'sgtk_menu.entries', 'sgtk_menu.categories',
+           'sgtk_menu.commands', 'sgtk_menu.history', 'sgtk_menu.search', 'sgtk_menu.usage', 'sgtk_menu.daemon',
+           'sgtk_menu.ipc', 'sgtk_menu.timings', 'sgtk_menu.spawn']
+# Best of a few runs, so that a busy machine does not fail the test
+RUNS = 3
+
+
+class TestImports(unittest.TestCase):
+    def setUp(self):
+        # Empty home: importing must not create anything in it
+        self.home = tempfile.TemporaryDirectory()
+        self.env = dict(os.environ, HOME=self.home.name, PYTHONPATH=os.pathsep.join(sys.path))
+        for name in ['XDG_CONFIG_HOME', 'XDG_CACHE_HOME', 'XDG_DATA_HOME']:
+            self.env.pop(name, None)
+
+    def tearDown(self):
+        self.home.cleanup()
+
+    def check(self, module):
+        times = []
+        for i in range(RUNS):
+            total, modules = import_times(module, self.env)
+            self.assertIsNotNone(total, modules)
+            times.append(total)
+        self.assertLessEqual(min(times), IMPORT_BUDGET,
+                             "{} imports in {:.1f} ms".format(module, min(times)))
+        self.assertEqual(os.listdir(self.home.name), [], "importing {} created files".format(module))
+
+    def test_modules(self):
+        for module in MODULES:
+            with self.subTest(module=module):
+                self.check(module)
+
+    @unittest.skipIf(gi is None, "PyGObject not installed")
+    def test_gtk_modules(self):
+        for module in GTK_MODULES:
+            with self.subTest(module=module):
+                self.check(module)
+
+    def test_launcher_without_gtk(self):
+        total, modules = import_times('sgtk_menu.launcher', self.env)
+        self.assertNotIn('gi', [name.strip() for ms, name in modules])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Tests of the i3 / sway IPC client against a mock server; no window manager nor GTK needed.
+Run with: python3 -m unittest
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+import os
+import json
+import socket
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from sgtk_menu import ipc, tools
+
+
+class MockServer(object):
+    """
+    Answers i3 / sway IPC messages the way the window manager does, and records them
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.messages = []  # [message type, payload]
+        self.connections = 0
+        self.drop = False  # close the connection instead of replying to the next message
+        self.reply_type = None  # reply with this message type instead of the one asked for
+        self.version = {"major": 1, "minor": 5, "human_readable": "1.5", "variant": "sway"}  # GET_VERSION reply
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(4)
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        while True:
+            try:
+                connection, address = self.server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self.handle, args=(connection,), daemon=True).start()
+
+    def receive(self, connection, length):
+        data = b''
+        while len(data) < length:
+            try:
+                chunk = connection.recv(length - len(data))
+            except OSError:
+                # e.g. the client has closed a connection we have not answered
+                return None
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def handle(self, connection):
+        with connection:
+            while True:
+                header = self.receive(connection, ipc.HEADER.size)
+                if header is None:
+                    return
+                magic, length, message_type = ipc.HEADER.unpack(header)
+                payload = self.receive(connection, length)
+                if payload is None:
+                    return
+                payload = payload.decode()
+                self.messages.append([message_type, payload])
+                if self.drop:
+                    self.drop = False
+                    return
+                data = json.dumps(self.reply(message_type, payload)).encode()
+                connection.sendall(ipc.HEADER.pack(ipc.MAGIC, len(data), self.reply_type or message_type) + data)
+
+    def reply(self, message_type, payload):
+        if message_type == ipc.RUN_COMMAND:
+            return [{"success": True} for command in payload.split(';')]
+        if message_type == ipc.GET_VERSION:
+            return self.version
+        return {}
+
+    def close(self):
+        self.server.close()
+
+
+class IPCTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'ipc.sock')
+        self.server = MockServer(self.path)
+        self.environ = mock.patch.dict(os.environ, {"SWAYSOCK": self.path, "XDG_RUNTIME_DIR": self.tmp_dir.name})
+        self.environ.start()
+        os.environ.pop("I3SOCK", None)
+        ipc.connection = None
+
+    def tearDown(self):
+        if ipc.connection:
+            ipc.connection.close()
+            ipc.connection = None
+        self.environ.stop()
+        self.server.close()
+        self.tmp_dir.cleanup()
+
+
+class TestIPC(IPCTestCase):
+    def test_framing(self):
+        reply = ipc.request(ipc.GET_VERSION)
+        self.assertEqual(reply["variant"], "sway")
+        self.assertEqual(self.server.messages, [[ipc.GET_VERSION, '']])
+
+    def test_large_reply(self):
+        # Longer than a single recv() may return
+        self.server.reply = lambda message_type, payload: {"data": "x" * 1000000}
+        self.assertEqual(len(ipc.request(ipc.GET_OUTPUTS)["data"]), 1000000)
+
+    def test_unexpected_reply_type(self):
+        self.server.reply_type = ipc.GET_SEATS
+        with mock.patch('builtins.print'):
+            self.assertIsNone(ipc.request(ipc.GET_VERSION))
+        self.assertIsNone(ipc.connection)
+
+    def test_one_connection(self):
+        for i in range(3):
+            self.assertIsNotNone(ipc.request(ipc.GET_VERSION))
+        ipc.run_commands('nop')
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(len(self.server.messages), 4)
+
+    def test_batched_commands(self):
+        results = ipc.run_commands('floating enable', 'border none', 'nop')
+        self.assertEqual(len(results), 3)
+        self.assertEqual(self.server.messages, [[ipc.RUN_COMMAND, 'floating enable; border none; nop']])
+
+    def test_reconnect(self):
+        self.assertIsNotNone(ipc.request(ipc.GET_VERSION))
+        self.server.drop = True
+        with mock.patch('builtins.print'):
+            self.assertIsNone(ipc.request(ipc.GET_VERSION))
+        self.assertIsNone(ipc.connection)
+        self.assertIsNotNone(ipc.request(ipc.GET_VERSION))
+        self.assertEqual(self.server.connections, 2)
+
+    def test_no_socket(self):
+        os.environ["SWAYSOCK"] = os.path.join(self.tmp_dir.name, 'missing.sock')
+        self.assertIsNone(ipc.request(ipc.GET_VERSION))
+
+
+class TestCheckWM(IPCTestCase):
+    def setUp(self):
+        super().setUp()
+        for name in ["DESKTOP_SESSION", "SWAYSOCK", "I3SOCK"]:
+            os.environ.pop(name, None)
+
+    def check_wm(self, sockets):
+        """
+        :param sockets: dictionary: WM => its socket path, as `<wm> --get-socketpath` would tell
+        """
+        with mock.patch.object(ipc, 'socket_path', side_effect=lambda wm=None: sockets.get(wm)):
+            return tools.check_wm()
+
+    def test_sway(self):
+        self.assertEqual(self.check_wm({"sway": self.path}), "sway")
+        self.assertEqual(self.server.messages, [[ipc.GET_VERSION, '']])
+
+    def test_i3(self):
+        # i3 does not tell the variant
+        self.server.version = {"major": 4, "minor": 18, "human_readable": "4.18"}
+        self.assertEqual(self.check_wm({"i3": self.path}), "i3")
+
+    def test_no_socket(self):
+        self.assertEqual(self.check_wm({}), "other")
+        self.assertEqual(self.server.messages, [])
+
+    def test_environment_first(self):
+        os.environ["DESKTOP_SESSION"] = "/usr/share/xsessions/openbox"
+        self.assertEqual(self.check_wm({"sway": self.path}), "openbox")
+        self.assertEqual(self.server.messages, [])
+
+
+class TestGeometry(IPCTestCase):
+    def setUp(self):
+        super().setUp()
+        outputs = [{"name": "HDMI-A-1", "focused": False, "rect": {"x": 0, "y": 0, "width": 1920, "height": 1080}},
+                   {"name": "DP-1", "focused": True, "rect": {"x": 1920, "y": 0, "width": 2560, "height": 1440}}]
+        self.server.reply = lambda message_type, payload: outputs if message_type == ipc.GET_OUTPUTS else {}
+
+    def test_sway(self):
+        self.assertEqual(tools.wait_for_geometry(None, "sway", None), (1920, 0, 2560, 1440))
+
+    def test_retried_after_dropped_connection(self):
+        self.assertIsNotNone(ipc.request(ipc.GET_VERSION))
+        self.server.drop = True
+        with mock.patch('builtins.print'):
+            self.assertEqual(tools.wait_for_geometry(None, "sway", None), (1920, 0, 2560, 1440))
+        self.assertEqual(self.server.connections, 2)
+
+
+class TestWindowRules(IPCTestCase):
+    def rule_messages(self):
+        return [m for m in self.server.messages if m[0] == ipc.RUN_COMMAND]
+
+    def test_sent_once(self):
+        tools.install_window_rules("sway")
+        tools.install_window_rules("sway")
+        self.assertEqual(self.rule_messages(), [[ipc.RUN_COMMAND, '; '.join(tools.WINDOW_RULES)]])
+
+    def test_not_on_other_wms(self):
+        tools.install_window_rules("i3")
+        self.assertEqual(self.rule_messages(), [])
+
+    def test_resent_to_new_session(self):
+        tools.install_window_rules("sway")
+        # sway restarted: new socket, same path
+        self.server.close()
+        os.unlink(self.path)
+        ipc.connection.close()
+        ipc.connection = None
+        self.server = MockServer(self.path)
+        tools.install_window_rules("sway")
+        self.assertEqual(len(self.rule_messages()), 1)
+
+    def test_failure_not_marked(self):
+        self.server.reply = lambda message_type, payload: [{"success": False}]
+        tools.install_window_rules("sway")
+        tools.install_window_rules("sway")
+        self.assertEqual(len(self.rule_messages()), 2)
+
+    def tree(self, window_type):
+        window = {"id": 42, "type": window_type, "pid": os.getpid(), "nodes": [], "floating_nodes": []}
+        workspace = {"id": 2, "type": "workspace", "pid": None, "nodes": [], "floating_nodes": []}
+        workspace["floating_nodes" if window_type == "floating_con" else "nodes"].append(window)
+        return {"id": 1, "type": "root", "nodes": [{"id": 3, "type": "output", "nodes": [workspace]}]}
+
+    def serve_tree(self, window_type):
+        reply = self.server.reply
+
+        def tree_reply(message_type, payload):
+            return self.tree(window_type) if message_type == ipc.GET_TREE else reply(message_type, payload)
+        self.server.reply = tree_reply
+
+    def test_floating_window_checked(self):
+        tools.install_window_rules("sway")
+        self.serve_tree("floating_con")
+        tools.check_window_rules("sway")
+        self.assertEqual(len(self.rule_messages()), 1)
+
+    def test_rules_dropped_by_reload(self):
+        tools.install_window_rules("sway")
+        # the marker still matches the session, but sway did not make our window floating
+        self.serve_tree("con")
+        tools.check_window_rules("sway")
+        self.assertEqual(self.rule_messages()[-1],
+                         [ipc.RUN_COMMAND, '; '.join(tools.WINDOW_RULES + ['[con_id=42] floating enable, border none'])])
+        # ...and the next launch trusts the marker again
+        tools.install_window_rules("sway")
+        self.assertEqual(len(self.rule_messages()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
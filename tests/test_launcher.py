@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Tests of the sgtk-menu entry point: handing over to a resident instance must not need GTK.
+Run with: python3 -m unittest
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+import os
+import sys
+import json
+import socket
+import tempfile
+import threading
+import subprocess
+import unittest
+from unittest import mock
+
+from sgtk_menu import launcher, daemon
+
+# Runs the entry point, and tells whether it exited before importing GTK
+CLIENT = '''
+import sys
+from sgtk_menu import launcher
+sys.argv = ['sgtk-menu'] + sys.argv[1:]
+try:
+    launcher.main()
+except SystemExit as e:
+    print(e.code, 'gi' in sys.modules, 'sgtk_menu.menu' in sys.modules)
+'''
+
+
+class MockDaemon(object):
+    """
+    Answers commands the way a resident sgtk-menu does, and records them
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.commands = []
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(daemon.socket_path('sgtk-menu'))
+        self.server.listen(4)
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                connection, address = self.server.accept()
+            except OSError:
+                return
+            with connection:
+                command = daemon.read_line(connection)
+                self.commands.append(command)
+                connection.sendall(b'ok\n' if command == 'show {}'.format(self.config) else b'mismatch\n')
+
+    def close(self):
+        self.server.close()
+
+
+class TestLauncher(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.environ = mock.patch.dict(os.environ, {"XDG_RUNTIME_DIR": self.tmp_dir.name,
+                                                    "HOME": self.tmp_dir.name,
+                                                    "PYTHONPATH": os.pathsep.join(sys.path)})
+        self.environ.start()
+
+    def tearDown(self):
+        self.environ.stop()
+        self.tmp_dir.cleanup()
+
+    def config(self, *argv):
+        with mock.patch.object(sys, 'argv', ['sgtk-menu'] + list(argv)):
+            return launcher.menu_config(launcher.parse_args())
+
+    def run_client(self, *argv):
+        result = subprocess.run([sys.executable, '-c', CLIENT] + list(argv), stdin=subprocess.DEVNULL,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=30)
+        return result.stdout.decode().split()
+
+    def test_import_without_gtk(self):
+        result = subprocess.run([sys.executable, '-c', 'import sys, sgtk_menu.launcher; print("gi" in sys.modules)'],
+                                stdout=subprocess.PIPE, timeout=30)
+        self.assertEqual(result.stdout.decode().strip(), 'False')
+
+    def test_instance_args_ignored(self):
+        self.assertEqual(self.config('-b', '-f'), self.config('-f', '-b', '-j', '8', '--timings'))
+        self.assertNotEqual(self.config('-b', '-f'), self.config('-n', '-a'))
+        self.assertEqual(json.loads(self.config('-b'))["bottom"], True)
+
+    def test_handover_without_gtk(self):
+        mock_daemon = MockDaemon(self.config('-b', '-f'))
+        try:
+            self.assertEqual(self.run_client('-b', '-f'), ['0', 'False', 'False'])
+        finally:
+            mock_daemon.close()
+        self.assertEqual(len(mock_daemon.commands), 1)
+
+    def test_other_arguments_not_handed_over(self):
+        mock_daemon = MockDaemon(self.config('-b', '-f'))
+        # Stands in for the GTK part: the client falls through to a normal instance
+        menu = mock.Mock()
+        try:
+            with mock.patch.dict(sys.modules, {'sgtk_menu.menu': menu}), \
+                    mock.patch('sgtk_menu.menu', menu, create=True), \
+                    mock.patch.object(sys, 'argv', ['sgtk-menu', '-n', '-a']), \
+                    mock.patch.object(launcher, 'read_pipe', return_value=None):
+                launcher.main()
+        finally:
+            mock_daemon.close()
+        self.assertEqual(len(mock_daemon.commands), 1)
+        args, pipe_menu, config = menu.main.call_args[0]
+        self.assertTrue(args.no_menu and args.append)
+        self.assertEqual(config, self.config('-n', '-a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Tests of the search shared by the launchers: ranking, and incremental narrowing.
+Run with: python3 -m unittest
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+import unittest
+
+from sgtk_menu.search import SearchIndex, match_score, command_key
+from sgtk_menu.categories import DesktopEntry
+
+ENTRIES = [DesktopEntry('Terminal', 'xterm'),
+           DesktopEntry('GNOME Terminal', 'gnome-terminal'),
+           DesktopEntry('Text Editor', 'gedit %U'),
+           DesktopEntry('Firefox', '/usr/bin/firefox --new-window'),
+           DesktopEntry('Image Viewer', 'eog'),
+           DesktopEntry('Terminal', 'alacritty')]
+
+
+class TestMatchScore(unittest.TestCase):
+    def test_ranking(self):
+        prefix = match_score('TERM', 'TERMINAL')
+        word_start = match_score('TERM', 'GNOME TERMINAL')
+        substring = match_score('ERM', 'TERMINAL')
+        subsequence = match_score('TRM', 'TERMINAL')
+        scattered = match_score('TL', 'TERMINAL')
+        self.assertGreater(prefix, word_start)
+        self.assertGreater(word_start, substring)
+        self.assertGreater(substring, subsequence)
+        self.assertGreater(subsequence, scattered)
+        self.assertIsNone(match_score('TX', 'TERMINAL'))
+
+    def test_command_key(self):
+        self.assertEqual(command_key('/usr/bin/firefox --new-window'), 'FIREFOX')
+        self.assertEqual(command_key(''), '')
+
+
+class TestSearchIndex(unittest.TestCase):
+    def names(self, items):
+        return [(item.name, item.exec) for item in items]
+
+    def test_best_first(self):
+        index = SearchIndex(ENTRIES)
+        self.assertEqual(self.names(index.search('term')),
+                         [('Terminal', 'xterm'), ('GNOME Terminal', 'gnome-terminal')])
+
+    def test_command_matches(self):
+        self.assertEqual(self.names(SearchIndex(ENTRIES).search('gedit')), [('Text Editor', 'gedit %U')])
+        self.assertEqual(self.names(SearchIndex(ENTRIES).search('firef')),
+                         [('Firefox', '/usr/bin/firefox --new-window')])
+
+    def test_clicks(self):
+        # of the same names, the one clicked more wins; clicks also lift a worse match
+        index = SearchIndex(ENTRIES, counts={'alacritty': 5, 'gnome-terminal': 100})
+        self.assertEqual(self.names(index.search('term')),
+                         [('GNOME Terminal', 'gnome-terminal'), ('Terminal', 'alacritty')])
+
+    def test_limit(self):
+        index = SearchIndex(ENTRIES)
+        self.assertEqual(index.search('e', limit=2), SearchIndex(ENTRIES).search('e')[:2])
+        self.assertEqual(len(index.search('e', limit=2)), 2)
+
+    def test_narrowing(self):
+        # typing a phrase char by char finds what a fresh index finds for each prefix
+        index = SearchIndex(ENTRIES)
+        for phrase in ['t', 'te', 'ter', 'term', 'termi', 'te', 'tex', 'x', 'xt']:
+            with self.subTest(phrase=phrase):
+                self.assertEqual(index.search(phrase), SearchIndex(ENTRIES).search(phrase))
+
+    def test_narrowing_looks_at_previous_matches_only(self):
+        index = SearchIndex(ENTRIES)
+        index.search('view')
+        self.assertEqual(len(index.matches), 1)
+        self.assertEqual(self.names(index.search('viewe')), [('Image Viewer', 'eog')])
+        # not an extension: back to all the keys
+        self.assertEqual(self.names(index.search('gedit')), [('Text Editor', 'gedit %U')])
+
+    def test_custom_keys(self):
+        index = SearchIndex(['firefox', 'foot', 'fuzzel'], name=str, command=str)
+        self.assertEqual(index.search('fo'), ['foot', 'firefox'])
+
+
+if __name__ == '__main__':
+    unittest.main()
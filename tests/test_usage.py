@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# _*_ coding: utf-8 _*_
+
+"""
+Tests of the clicks counters: concurrent appends, and compaction of the log into the JSON file.
+Run with: python3 -m unittest
+
+Author: Piotr Miller
+Copyright (c) 2020 Piotr Miller & Contributors
+e-mail: nwg.piotr@gmail.com
+Website: http://nwg.pl
+Project: https://github.com/nwg-piotr/sgtk-menu
+License: GPL3
+"""
+
+import os
+import sys
+import tempfile
+import subprocess
+import unittest
+
+from sgtk_menu import usage
+
+# Records launches from a separate process; a tiny COMPACT_SIZE makes processes compact all the time
+WRITER = '''
+import sys
+from sgtk_menu import usage
+usage.COMPACT_SIZE = int(sys.argv[4])
+for i in range(int(sys.argv[3])):
+    usage.record_launch(sys.argv[1], sys.argv[2] if i % 2 else "shared command")
+'''
+
+PROCESSES = 6
+LAUNCHES = 200
+
+
+class TestUsage(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.tmp_dir.name, 'sgtk-menu')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_writers(self, compact_size):
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        writers = [subprocess.Popen([sys.executable, '-c', WRITER, self.cache_file, 'command {}'.format(i),
+                                     str(LAUNCHES), str(compact_size)], env=env) for i in range(PROCESSES)]
+        for writer in writers:
+            self.assertEqual(writer.wait(timeout=60), 0)
+
+    def expected(self):
+        counts = {'command {}'.format(i): LAUNCHES // 2 for i in range(PROCESSES)}
+        counts["shared command"] = PROCESSES * LAUNCHES // 2
+        return counts
+
+    def test_concurrent_appends(self):
+        self.run_writers(compact_size=1024 * 1024)
+        self.assertFalse(os.path.exists(self.cache_file))
+        self.assertEqual(usage.load_counts(self.cache_file), self.expected())
+
+    def test_concurrent_compaction(self):
+        self.run_writers(compact_size=256)
+        # Records have been folded into the JSON file, and none got lost nor counted twice
+        self.assertTrue(os.path.isfile(self.cache_file))
+        self.assertLessEqual(os.path.getsize(usage.log_file(self.cache_file)), 256 + 64)
+        self.assertEqual(usage.load_counts(self.cache_file), self.expected())
+        usage.compact(self.cache_file)
+        self.assertEqual(os.path.getsize(usage.log_file(self.cache_file)), 0)
+        self.assertEqual(usage.load_counts(self.cache_file), self.expected())
+
+    def test_torn_record(self):
+        usage.record_launch(self.cache_file, "firefox")
+        with open(usage.log_file(self.cache_file), 'a') as f:
+            f.write('"half a rec')
+        self.assertEqual(usage.load_counts(self.cache_file), {"firefox": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()